@@ -0,0 +1,55 @@
+"""i18n.t() 吞吐量微基准
+
+    python benchmarks/bench_i18n.py [--number N]
+
+对比编译后的目录与旧实现（每次调用都拆分语言标签、三级回退查找并 str.format）。
+"""
+import argparse
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from authbot import i18n  # noqa: E402
+
+
+def _legacy_t(messages, key, lang, **kwargs):
+    lang = (lang or i18n.DEFAULT_LANG).split("-")[0]
+    bundle = messages.get(key, {})
+    template = bundle.get(lang) or bundle.get("en") or bundle.get("zh") or key
+    try:
+        return template.format(**kwargs)
+    except Exception:
+        return template
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200_000)
+    args = parser.parse_args()
+
+    catalog = i18n.get_catalog()
+    messages = {}
+    for lang in catalog.available():
+        for key, text in catalog._load(lang).items():
+            messages.setdefault(key, {})[lang] = text
+
+    cases = [
+        ("static", "already_verified", "en", {}),
+        ("format", "use_channel", "zh", {"channel": "auth-verify"}),
+        ("region tag", "generic_error", "en-US", {}),
+    ]
+    i18n.t("already_verified", "zh")  # 排除首次加载的开销
+    for label, key, lang, kwargs in cases:
+        new = timeit.timeit(lambda: i18n.t(key, lang, **kwargs), number=args.number)
+        old = timeit.timeit(lambda: _legacy_t(messages, key, lang, **kwargs), number=args.number)
+        print(f"{label:<11} compiled {args.number / new:>12,.0f}/s   legacy {args.number / old:>12,.0f}/s"
+              f"   x{old / new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
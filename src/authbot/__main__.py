@@ -1,4 +1,8 @@
-from .main import run
+import sys
+
+from .main import cli, run
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(cli())
     run()
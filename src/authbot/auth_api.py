@@ -1,19 +1,333 @@
 from __future__ import annotations
 
+import os
+import time
+import random
+import asyncio
 import logging
 import httpx
-from typing import Any, Dict, Optional
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
 
 log = logging.getLogger("authbot.auth_api")
 
+
+class AuthQueueFull(Exception):
+    """The login queue is at capacity; the request was rejected without waiting."""
+
+
+class AuthQueueTimeout(Exception):
+    """A queued login request waited longer than the configured maximum."""
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class CircuitOpenError(Exception):
+    """The auth API circuit is open; the call was short-circuited without a request."""
+
+
+# Failures where the request never reached the server, so retrying cannot double-submit
+_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Upstream availability problems (500 is the API's "bad credentials" answer, so it is not counted)
+_UNAVAILABLE_STATUSES = {502, 503, 504}
+
+
+class CircuitBreaker:
+    """Consecutive-failure / error-rate circuit breaker with half-open probing.
+
+    The circuit opens after ``failure_threshold`` consecutive failures, or when
+    at least ``min_calls`` of the last ``window`` calls were recorded and the
+    failure ratio reaches ``error_rate``. After ``reset_timeout`` seconds one
+    probe call is let through (half-open); its outcome closes or re-opens the
+    circuit. Outcomes of other calls that finish while the circuit is open or
+    half-open are recorded but never change the state.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        error_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 10,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.opened_count = 0
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        """True while calls should be rejected outright (open and not yet due for a probe)."""
+        return self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow(self) -> Tuple[bool, bool]:
+        """Return ``(allowed, is_probe)``.
+
+        ``is_probe`` is True only for the single call let through while
+        half-open; that caller must :meth:`release` the probe slot when done.
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False, False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                return False, False
+            self._probe_in_flight = True
+            return True, True
+        return True, False
+
+    def record_success(self, probe: bool = False) -> None:
+        """Record a successful call; only the half-open probe may close the circuit.
+
+        Calls admitted before the circuit opened can still finish afterwards;
+        their outcomes are counted but do not change the state.
+        """
+        self._outcomes.append(True)
+        if self.state == self.CLOSED:
+            self._consecutive_failures = 0
+        elif self.state == self.HALF_OPEN and probe:
+            log.info("AuthAPI: circuit closed after successful probe")
+            self._outcomes.clear()
+            self._consecutive_failures = 0
+            self.state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self, probe: bool = False) -> None:
+        self._outcomes.append(False)
+        self._consecutive_failures += 1
+        if self.state == self.CLOSED:
+            if self._should_open():
+                self._open()
+        elif self.state == self.HALF_OPEN and probe:
+            self._open()
+
+    def release(self) -> None:
+        """Free the half-open probe slot; only the probe call may call this."""
+        self._probe_in_flight = False
+
+    def _should_open(self) -> bool:
+        if self._consecutive_failures >= self.failure_threshold:
+            return True
+        if len(self._outcomes) < self.min_calls:
+            return False
+        failures = sum(1 for ok in self._outcomes if not ok)
+        return failures / len(self._outcomes) >= self.error_rate
+
+    def _open(self) -> None:
+        if self.state != self.OPEN:
+            log.warning("AuthAPI: circuit opened for %.0fs", self.reset_timeout)
+            self.opened_count += 1
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+
+class LoginLimiter:
+    """FIFO concurrency limiter for upstream login calls.
+
+    At most ``max_concurrency`` requests run at once; the rest wait in arrival
+    order for up to ``max_wait`` seconds. ``max_queue`` caps the number of
+    waiters (0 = unbounded) so a burst degrades into fast rejections instead
+    of an ever-growing backlog.
+    """
+
+    def __init__(self, max_concurrency: int = 10, max_wait: float = 30.0, max_queue: int = 0) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    @property
+    def saturated(self) -> bool:
+        """True when a new request would have to queue."""
+        return self.active >= self.max_concurrency or self.waiting > 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._sem.locked() or self.waiting:
+            await self._wait_for_slot()
+        else:
+            # Fast path: a slot is free, acquire() returns without suspending
+            await self._sem.acquire()
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._sem.release()
+
+    async def _wait_for_slot(self) -> None:
+        if self.max_queue and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise AuthQueueFull(f"login queue is full ({self.waiting} waiting)")
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise AuthQueueTimeout(f"waited more than {self.max_wait:.0f}s for a login slot") from None
+        finally:
+            self.waiting -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+        }
+
+
 class AuthAPI:
-    """Simple client for the login auth API."""
+    """Client for the login auth API.
 
-    def __init__(self, base_url: str, timeout: float = 10.0) -> None:
+    Owns one pooled ``httpx.AsyncClient`` for its whole lifetime so repeated
+    logins reuse keep-alive connections instead of paying DNS + TCP + TLS
+    setup on every call. Call :meth:`aclose` on shutdown.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 10.0,
+        *,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        max_concurrency: int = 10,
+        queue_wait: float = 30.0,
+        queue_max: int = 0,
+        retries: int = 2,
+        retry_backoff: float = 0.2,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and not _http2_available():
+            log.warning("AuthAPI: HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.limiter = LoginLimiter(max_concurrency, max_wait=queue_wait, max_queue=queue_max)
+        self.retries = max(0, retries)
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["AuthAPI"]:
+        """Build a client from AUTH_API_* environment variables, or None if unconfigured."""
+        base = os.getenv("AUTH_API_BASE")
+        if not base:
+            return None
+        return cls(
+            base,
+            timeout=float(os.getenv("AUTH_API_TIMEOUT", "10")),
+            max_connections=int(os.getenv("AUTH_API_MAX_CONNECTIONS", "100")),
+            max_keepalive=int(os.getenv("AUTH_API_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("AUTH_API_KEEPALIVE_EXPIRY", "30")),
+            http2=os.getenv("AUTH_API_HTTP2", "false").strip().lower() in {"1", "true", "yes", "y", "on"},
+            max_concurrency=int(os.getenv("AUTH_API_CONCURRENCY", "10")),
+            queue_wait=float(os.getenv("AUTH_API_QUEUE_WAIT", "30")),
+            queue_max=int(os.getenv("AUTH_API_QUEUE_MAX", "500")),
+            retries=int(os.getenv("AUTH_API_RETRIES", "2")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("AUTH_API_BREAKER_FAILURES", "5")),
+                error_rate=float(os.getenv("AUTH_API_BREAKER_ERROR_RATE", "0.5")),
+                reset_timeout=float(os.getenv("AUTH_API_BREAKER_RESET", "30")),
+            ),
+        )
+
+    def open(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, http2=self.http2)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def login(self, login: str, password: str) -> Dict[str, Any]:
+        """POST credentials upstream, waiting for a free slot in :attr:`limiter` first.
+
+        Raises :class:`CircuitOpenError` immediately while the circuit is open
+        (checked again once a slot is acquired, so queued calls do not go
+        upstream after the circuit trips), and :class:`AuthQueueFull` /
+        :class:`AuthQueueTimeout` when the request could not get a slot. Connection-level failures are retried with
+        jittered exponential backoff.
+        """
+        if self.breaker.is_open():
+            raise CircuitOpenError("auth API is temporarily unavailable")
+        async with self.limiter.slot():
+            # The circuit may have opened while we were queued; check again before going upstream.
+            allowed, probe = self.breaker.allow()
+            if not allowed:
+                raise CircuitOpenError("auth API is temporarily unavailable")
+            try:
+                return await self._login_with_retry(login, password, probe)
+            finally:
+                if probe:
+                    self.breaker.release()
+
+    async def _login_with_retry(self, login: str, password: str, probe: bool = False) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            try:
+                payload = await self._login(login, password)
+            except _RETRYABLE_ERRORS as e:
+                if attempt >= self.retries:
+                    self.breaker.record_failure(probe)
+                    raise
+                attempt += 1
+                delay = random.uniform(0, min(2.0, self.retry_backoff * (2 ** attempt)))
+                log.info("AuthAPI: %s, retry %d/%d in %.2fs", type(e).__name__, attempt, self.retries, delay)
+                await asyncio.sleep(delay)
+                continue
+            except httpx.TransportError:
+                self.breaker.record_failure(probe)
+                raise
+            if int(payload.get("status_code", 0)) in _UNAVAILABLE_STATUSES:
+                self.breaker.record_failure(probe)
+            else:
+                self.breaker.record_success(probe)
+            return payload
+
+    async def _login(self, login: str, password: str) -> Dict[str, Any]:
         # API expects action in query string per provided cURL example
         url = f"{self.base_url}/?action=login"
         data = {
@@ -22,19 +336,19 @@ class AuthAPI:
         }
         # Do not log credentials; log high-level info only
         log.info("AuthAPI: POST %s", url)
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            resp = await client.post(url, data=data, headers={"Content-Type": "application/x-www-form-urlencoded"})
-            status = resp.status_code
-            log.debug("AuthAPI: response status=%s", status)
-            try:
-                payload = resp.json()
-            except Exception:
-                # Non-JSON response; normalize
-                payload = {"success": False}
-            # Surface HTTP status for callers without raising
-            payload.setdefault("status_code", status)
-            log.info("AuthAPI: login success=%s status=%s", bool(payload.get("success")), status)
-            return payload
+        client = self.open()
+        resp = await client.post(url, data=data, headers={"Content-Type": "application/x-www-form-urlencoded"})
+        status = resp.status_code
+        log.debug("AuthAPI: response status=%s http_version=%s", status, resp.http_version)
+        try:
+            payload = resp.json()
+        except Exception:
+            # Non-JSON response; normalize
+            payload = {"success": False}
+        # Surface HTTP status for callers without raising
+        payload.setdefault("status_code", status)
+        log.info("AuthAPI: login success=%s status=%s", bool(payload.get("success")), status)
+        return payload
 
     @staticmethod
     def pick_username(payload: Dict[str, Any]) -> Optional[str]:
@@ -1,98 +1,171 @@
 from __future__ import annotations
 
 import os
+import math
 import logging
-from typing import Optional
+import tempfile
+from typing import Any, Dict, List, Optional
 
 import discord
 from discord import app_commands, Interaction
 from discord.ext import commands
 
-from .auth_api import AuthAPI
+from .auth_api import AuthAPI, AuthQueueFull, AuthQueueTimeout, CircuitOpenError
+from .batch import BatchExecutor, BatchResult
+from .config import get_config
+from .context import AuthContext
+from .embeds import get_embed
 from .i18n import t
-from .prefs import set_lang, get_lang
-from .storage import mark_verified, revoke_verified, is_verified, get_user_info
+from .members import roles_after
+from .overwrites import OverwriteChange, format_plan, plan_overwrites
+from .prefs import set_lang
+from .ratelimit import get_login_limiter
+from .reconcile import ReconcileReport, RoleReconciler
+from .resolver import get_resolver
+from .storage import get_async_db
+from .transfer import detect_format, export_guild, import_bytes
 
 log = logging.getLogger("authbot.auth_commands")
 
 
-def _truthy(val: Optional[str], default: bool = True) -> bool:
-    if val is None:
-        return default
-    return val.strip().lower() in {"1", "true", "yes", "y", "on"}
-
-
 def get_role_name() -> str:
-    return os.getenv("AUTH_SUCCESS_ROLE", "Verified")
+    return get_config().role_name
 
 
 def get_channel_name() -> str:
-    return os.getenv("AUTH_CHANNEL_NAME", "auth-verify")
+    return get_config().channel_name
+
+
+def get_auth_api(interaction: Interaction) -> Optional[AuthAPI]:
+    """取得 bot 启动时创建的共享 AuthAPI 客户端"""
+    return getattr(interaction.client, "auth_api", None)
 
 
 # ==================== 辅助函数 ====================
 
-async def grant_role_and_nick(interaction: Interaction, username: str, role_name: str) -> Optional[str]:
-    """授予角色和更新昵称"""
-    guild = interaction.guild
+def _unverified_role(ctx: AuthContext) -> Optional[discord.Role]:
+    name = get_config().unverified_role_name
+    return ctx.role(name) if name else None
+
+
+async def grant_role_and_nick(ctx: AuthContext, username: str, role_name: str,
+                              member: Optional[discord.Member] = None) -> Optional[str]:
+    """授予角色、移除未验证角色并更新昵称
+
+    ``member`` 应为提交时交互载荷中的成员，其角色列表是最新的，角色与昵称合并为
+    一次 member.edit。未提供时成员可能来自缓存，改用 add_roles/remove_roles 逐个
+    修改角色，避免用过期的角色列表覆盖期间的变动。
+    """
+    guild = ctx.guild
     if guild is None:
-        return t("guild_not_found", get_lang(0, interaction.user.id))
-    
-    member = guild.get_member(interaction.user.id) or await guild.fetch_member(interaction.user.id)
-    role = discord.utils.get(guild.roles, name=role_name)
-    
+        return ctx.t("guild_not_found")
+
+    current = member is not None
+    if member is None:
+        member = await ctx.get_member()
+    role = ctx.role(role_name)
+
     if role is None:
         try:
             role = await guild.create_role(name=role_name, reason="Auth success: create missing role")
+            ctx.remember_role(role_name, role)
         except Exception:
-            return t("role_create_failed", get_lang(guild.id, interaction.user.id))
+            return ctx.t("role_create_failed")
+
+    changes: Dict[str, Any] = {}
+    unverified = _unverified_role(ctx)
+    if current:
+        roles = roles_after(member, add=role, remove=unverified)
+        if roles is not None:
+            changes["roles"] = roles
+    else:
+        # 两个接口都是幂等的，不依赖缓存中的角色列表判断
+        try:
+            await member.add_roles(role, reason=f"Authenticated as {username}")
+            if unverified is not None:
+                await member.remove_roles(unverified, reason=f"Authenticated as {username}")
+        except discord.Forbidden:
+            return ctx.t("role_permission_denied")
+        except Exception as e:
+            return ctx.t("role_assign_failed", error=str(e))
+    # 服务器所有者的昵称机器人无权修改，直接跳过以免整个请求被拒
+    if member.nick != username and member.id != guild.owner_id:
+        changes["nick"] = username
+    if not changes:
+        return None
 
     try:
-        await member.add_roles(role, reason=f"Authenticated as {username}")
+        await member.edit(**changes, reason=f"Authenticated as {username}")
+        return None
     except discord.Forbidden:
-        return t("role_permission_denied", get_lang(guild.id, interaction.user.id))
+        if "roles" not in changes:
+            return None  # 只有昵称修改失败，与以前一样忽略
+        if "nick" not in changes:
+            return ctx.t("role_permission_denied")
     except Exception as e:
-        return t("role_assign_failed", get_lang(guild.id, interaction.user.id), error=str(e))
+        return ctx.t("role_assign_failed", error=str(e))
 
+    # 角色和昵称一起被拒时，多半是昵称无权修改（成员身份组高于机器人），只重试角色
     try:
-        await member.edit(nick=username, reason="Set nickname after authentication")
+        await member.edit(roles=changes["roles"], reason=f"Authenticated as {username}")
     except discord.Forbidden:
-        pass
-    except Exception:
-        pass
+        return ctx.t("role_permission_denied")
+    except Exception as e:
+        return ctx.t("role_assign_failed", error=str(e))
     return None
 
 
-def create_login_modal(guild: discord.Guild, interaction: Interaction, api: AuthAPI, bot: Optional[commands.Bot] = None):
+def create_login_modal(ctx: AuthContext, api: AuthAPI) -> discord.ui.Modal:
     """创建登录模态框"""
-    
+    guild = ctx.guild
+
     class LoginModal(discord.ui.Modal):
         def __init__(self):
-            super().__init__(title=t("modal_title", get_lang(guild.id, interaction.user.id)))
-        
+            super().__init__(title=ctx.t("modal_title"))
+
         login_input: discord.ui.TextInput = discord.ui.TextInput(
-            label=t("modal_login_label", get_lang(guild.id, interaction.user.id)), 
-            placeholder=t("modal_login_placeholder", get_lang(guild.id, interaction.user.id)), 
-            required=True, 
+            label=ctx.t("modal_login_label"),
+            placeholder=ctx.t("modal_login_placeholder"),
+            required=True,
             max_length=120
         )
         password_input: discord.ui.TextInput = discord.ui.TextInput(
-            label=t("modal_password_label", get_lang(guild.id, interaction.user.id)), 
-            style=discord.TextStyle.short, 
-            required=True, 
+            label=ctx.t("modal_password_label"),
+            style=discord.TextStyle.short,
+            required=True,
             max_length=120
         )
 
         async def on_submit(self, modal_interaction: Interaction) -> None:
             await modal_interaction.response.defer(ephemeral=True, thinking=True)
             role_name = get_role_name()
-            
+
+            wait = get_login_limiter().hit(guild.id, modal_interaction.user.id)
+            if wait > 0:
+                await modal_interaction.followup.send(ctx.t("rate_limited", seconds=math.ceil(wait)), ephemeral=True)
+                return
+
+            if api.limiter.saturated:
+                log.info("Auth queued: user=%s queue=%s", modal_interaction.user.id, api.limiter.stats())
+                await modal_interaction.followup.send(
+                    ctx.t("auth_queued", position=api.limiter.waiting + 1),
+                    ephemeral=True
+                )
+
             try:
                 payload = await api.login(login=str(self.login_input.value), password=str(self.password_input.value))
+            except (AuthQueueFull, AuthQueueTimeout) as e:
+                log.warning("Auth not attempted: user=%s reason=%s", modal_interaction.user.id, e)
+                await modal_interaction.followup.send(ctx.t("auth_queue_timeout"), ephemeral=True)
+                return
+            except CircuitOpenError as e:
+                log.warning("Auth short-circuited: user=%s", modal_interaction.user.id)
+                await modal_interaction.followup.send(ctx.t("auth_request_failed", error=str(e)), ephemeral=True)
+                return
             except Exception as e:
                 log.exception("Auth request failed: user=%s", modal_interaction.user.id)
                 await modal_interaction.followup.send(
-                    t("auth_request_failed", get_lang(guild.id, modal_interaction.user.id), error=str(e)), 
+                    ctx.t("auth_request_failed", error=str(e)),
                     ephemeral=True
                 )
                 return
@@ -101,81 +174,255 @@ def create_login_modal(guild: discord.Guild, interaction: Interaction, api: Auth
                 status = int(payload.get("status_code", 0))
                 log.info("Auth failed: user=%s http_status=%s", modal_interaction.user.id, status)
                 if status == 500:
-                    await modal_interaction.followup.send(
-                        t("auth_failed_500", get_lang(guild.id, modal_interaction.user.id)), 
-                        ephemeral=True
-                    )
+                    await modal_interaction.followup.send(ctx.t("auth_failed_500"), ephemeral=True)
                 else:
-                    await modal_interaction.followup.send(
-                        t("auth_failed_generic", get_lang(guild.id, modal_interaction.user.id)), 
-                        ephemeral=True
-                    )
+                    await modal_interaction.followup.send(ctx.t("auth_failed_generic"), ephemeral=True)
                 return
 
             username = AuthAPI.pick_username(payload) or "user"
             log.info("Auth success: user=%s username=%s", modal_interaction.user.id, username)
-            
-            err = await grant_role_and_nick(modal_interaction, username, role_name)
+
+            # 提交时的成员信息来自本次交互载荷，比打开表单时的 ctx.member 新
+            submitter = modal_interaction.user if isinstance(modal_interaction.user, discord.Member) else None
+            err = await grant_role_and_nick(ctx, username, role_name, submitter)
             if err:
                 log.warning("Post-auth issue: user=%s err=%s", modal_interaction.user.id, err)
                 await modal_interaction.followup.send(
-                    t("auth_partial_success", get_lang(guild.id, modal_interaction.user.id), username=username, error=err), 
+                    ctx.t("auth_partial_success", username=username, error=err),
                     ephemeral=True
                 )
                 return
 
             try:
-                mark_verified(
-                    guild_id=guild.id, 
-                    user_id=modal_interaction.user.id, 
-                    record={"username": username}
+                await get_async_db().mark_verified(
+                    guild_id=guild.id,
+                    user_id=modal_interaction.user.id,
+                    username=username
                 )
             except Exception:
                 pass
 
             await modal_interaction.followup.send(
-                t("auth_success", get_lang(guild.id, modal_interaction.user.id), username=username), 
+                ctx.t("auth_success", username=username),
                 ephemeral=True
             )
 
     return LoginModal()
 
 
+class VerifiedListView(discord.ui.View):
+    """已验证用户分页列表：每次翻页只查询当前这一页"""
+
+    PAGE_SIZE = 25
+
+    def __init__(self, ctx: AuthContext) -> None:
+        super().__init__(timeout=300)
+        self.ctx = ctx
+        self.total = 0
+        # 每一页起始游标，栈顶为当前页
+        self._cursors: List[Optional[int]] = []
+        self._next: Optional[int] = None
+
+    async def load_page(self, cursor: Optional[int]) -> Optional[discord.Embed]:
+        ctx = self.ctx
+        db = get_async_db()
+        if not self._cursors:
+            self.total = await db.count_verified(ctx.guild_id)
+        rows, self._next = await db.get_verified_page(ctx.guild_id, cursor, self.PAGE_SIZE)
+        if not rows:
+            return None
+        self._cursors.append(cursor)
+
+        lines = []
+        for row in rows:
+            user_id = int(row["user_id"])
+            username = row.get("username", "Unknown")
+            member = ctx.guild.get_member(user_id)
+            if member:
+                lines.append(f"• {member.mention} → `{username}`")
+            else:
+                lines.append(f"• <@{user_id}> → `{username}` (已离开)")
+
+        page = len(self._cursors)
+        pages = max(1, -(-self.total // self.PAGE_SIZE))
+        embed = discord.Embed(
+            title=ctx.t("verified_list_title"),
+            description="\n".join(lines),
+            color=discord.Color.green()
+        )
+        embed.set_footer(text=ctx.t("verified_list_footer", page=page, pages=pages, total=self.total))
+        self.prev_page.disabled = page <= 1
+        self.next_page.disabled = self._next is None
+        return embed
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        return interaction.user.id == self.ctx.user_id
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: Interaction, button: discord.ui.Button):
+        self._cursors.pop()
+        cursor = self._cursors.pop()
+        embed = await self.load_page(cursor)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, button: discord.ui.Button):
+        embed = await self.load_page(self._next)
+        if embed is None:
+            button.disabled = True
+            await interaction.response.edit_message(view=self)
+            return
+        await interaction.response.edit_message(embed=embed, view=self)
+
+
+async def _send_error(interaction: Interaction, error: Exception, generic: bool = True) -> None:
+    """管理员命令共用的错误处理"""
+    from discord.app_commands.errors import MissingPermissions
+    ctx = await AuthContext.from_interaction(interaction)
+    if isinstance(error, MissingPermissions):
+        await interaction.response.send_message(ctx.t("missing_admin"), ephemeral=True)
+    elif generic:
+        try:
+            if interaction.response.is_done():
+                await interaction.followup.send(ctx.t("generic_error"), ephemeral=True)
+            else:
+                await interaction.response.send_message(ctx.t("generic_error"), ephemeral=True)
+        except discord.HTTPException as e:
+            # 长时间运行的命令可能已超出交互令牌有效期
+            log.warning("Could not report command error %r: %s", error, e)
+
+
+# ==================== 欢迎面板 ====================
+
+class WelcomeView(discord.ui.View):
+    """验证频道里的欢迎面板：快捷登录和语言切换"""
+
+    def __init__(self) -> None:
+        super().__init__(timeout=None)
+
+    @discord.ui.button(label="🔐 登录验证 / Login", style=discord.ButtonStyle.success, custom_id="quick_login", row=0)
+    async def quick_login(self, btn_interaction: Interaction, button: discord.ui.Button):
+        ctx = await AuthContext.from_interaction(btn_interaction)
+        if ctx.guild is None:
+            await btn_interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
+            return
+        # Check if already verified
+        member = ctx.member
+        if member:
+            role = ctx.role(get_role_name())
+            if role and role in member.roles:
+                await btn_interaction.response.send_message(ctx.t("already_verified"), ephemeral=True)
+                return
+
+        api = get_auth_api(btn_interaction)
+        if api is None:
+            await btn_interaction.response.send_message(ctx.t("api_not_config"), ephemeral=True)
+            return
+
+        wait = get_login_limiter().retry_after(ctx.guild_id, btn_interaction.user.id)
+        if wait > 0:
+            await btn_interaction.response.send_message(ctx.t("rate_limited", seconds=math.ceil(wait)), ephemeral=True)
+            return
+
+        modal = create_login_modal(ctx, api)
+        await btn_interaction.response.send_modal(modal)
+
+    @discord.ui.button(label="🇨🇳 中文", style=discord.ButtonStyle.secondary, custom_id="lang_zh", row=1)
+    async def zh(self, btn_interaction: Interaction, button: discord.ui.Button):
+        guild_id = btn_interaction.guild.id if btn_interaction.guild else 0
+        await set_lang(guild_id, btn_interaction.user.id, "zh")
+        await btn_interaction.response.send_message(t("lang_set_zh", "zh"), ephemeral=True)
+
+    @discord.ui.button(label="🇺🇸 English", style=discord.ButtonStyle.secondary, custom_id="lang_en", row=1)
+    async def en(self, btn_interaction: Interaction, button: discord.ui.Button):
+        guild_id = btn_interaction.guild.id if btn_interaction.guild else 0
+        await set_lang(guild_id, btn_interaction.user.id, "en")
+        await btn_interaction.response.send_message(t("lang_set_en", "en"), ephemeral=True)
+
+_welcome_view: Optional[WelcomeView] = None
+
+
+def get_welcome_view() -> WelcomeView:
+    """整个进程共用的欢迎面板视图
+
+    启动时通过 bot.add_view 注册为持久视图，重启后旧面板上的按钮仍然有效；
+    发送新面板时也复用这个实例。必须在事件循环内首次调用。
+    """
+    global _welcome_view
+    if _welcome_view is None:
+        _welcome_view = WelcomeView()
+    return _welcome_view
+
+
 # ==================== 管理员命令组 ====================
 
 class AuthCommands(app_commands.Group, name="auth", description="🛡️ 身份验证管理 / Auth management (Admin)"):
     """管理员命令组 - 用于设置和管理验证系统"""
-    
+
     def __init__(self, bot: commands.Bot) -> None:
         super().__init__()
         self.bot = bot
 
-    async def _ensure_channel_overwrites(self, channel: discord.TextChannel, guild: discord.Guild, success_role: discord.Role) -> None:
-        await channel.set_permissions(guild.default_role, view_channel=True, send_messages=True)
-        await channel.set_permissions(success_role, view_channel=True, send_messages=True)
-        await channel.set_permissions(guild.me, view_channel=True, send_messages=True)
+    async def _apply_overwrite_plan(self, ctx: AuthContext, plan: List[OverwriteChange]) -> None:
+        """并发写入覆盖权限改动，并在临时消息中汇报进度"""
+        interaction = ctx.interaction
+        progress_msg = await interaction.followup.send(
+            ctx.t("setup_progress", done=0, total=len(plan)), ephemeral=True, wait=True
+        )
+
+        async def report(result: BatchResult) -> None:
+            await progress_msg.edit(content=ctx.t("setup_progress", done=result.finished, total=result.total))
+
+        executor = BatchExecutor(
+            concurrency=get_config().setup_concurrency,
+            progress=report,
+        )
+        result = await executor.run([change.job() for change in plan])
+        log.info("Setup overwrites applied in guild %s: done=%d failed=%d", ctx.guild_id, result.done, result.failed)
+        try:
+            await progress_msg.edit(content=ctx.t("setup_progress_done", done=result.done, failed=result.failed))
+        except Exception:
+            pass
 
     @app_commands.command(name="setup", description="🔧 初始化认证系统 / Initialize auth system")
     @app_commands.checks.has_permissions(administrator=True)
-    async def setup(self, interaction: Interaction):
-        guild = interaction.guild
+    @app_commands.describe(dry_run="只显示将要修改的权限，不实际执行 / Only show the planned changes")
+    async def setup(self, interaction: Interaction, dry_run: bool = False):
+        ctx = await AuthContext.from_interaction(interaction)
+        guild = ctx.guild
         if guild is None:
-            await interaction.response.send_message(t("must_use_in_server", get_lang(0, interaction.user.id)), ephemeral=True)
+            await interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
             return
 
         await interaction.response.defer(ephemeral=True, thinking=True)
 
         role_name = get_role_name()
         channel_name = get_channel_name()
+        hide_others = get_config().hide_other_channels
+
+        role = ctx.role(role_name)
+        channel = get_resolver().text_channel(guild, channel_name)
+
+        if dry_run:
+            plan = plan_overwrites(guild, role, channel, hide_others, role_name=role_name)
+            lines = []
+            if role is None:
+                lines.append(ctx.t("setup_plan_create_role", role=role_name))
+            if channel is None:
+                lines.append(ctx.t("setup_plan_create_channel", channel=channel_name))
+            if plan:
+                lines.append("```\n" + format_plan(plan) + "\n```")
+            summary = ctx.t("setup_plan_summary", count=len(plan))
+            await interaction.followup.send("\n".join([summary] + lines)[:2000], ephemeral=True)
+            return
 
         # Create/find roles
-        role = discord.utils.get(guild.roles, name=role_name)
         if role is None:
             log.info("Creating role '%s' in guild %s", role_name, guild.id)
             role = await guild.create_role(name=role_name, reason="Auth setup: success role")
+            ctx.remember_role(role_name, role)
 
         # Create/find text channel
-        channel = discord.utils.get(guild.text_channels, name=channel_name)
         if channel is None:
             overwrites = {
                 guild.default_role: discord.PermissionOverwrite(view_channel=True, send_messages=True),
@@ -184,30 +431,16 @@ class AuthCommands(app_commands.Group, name="auth", description="🛡️ 身份
             }
             log.info("Creating auth channel '%s' in guild %s", channel_name, guild.id)
             channel = await guild.create_text_channel(channel_name, overwrites=overwrites, reason="Auth setup: channel")
-        else:
-            log.info("Updating auth channel '%s' overwrites in guild %s", channel.name, guild.id)
-            await self._ensure_channel_overwrites(channel, guild, role)
-
-        # Hide other channels from @everyone, allow Verified
-        hide_others = _truthy(os.getenv("AUTH_HIDE_OTHER_CHANNELS", "true"), default=True)
-        if hide_others:
-            for category in guild.categories:
-                try:
-                    await category.set_permissions(guild.default_role, view_channel=False)
-                    await category.set_permissions(role, view_channel=True)
-                except Exception as e:
-                    log.warning("Failed to set category overwrite: category=%s err=%s", category.id, e)
-            for ch in guild.text_channels:
-                if ch.id == channel.id:
-                    continue
-                try:
-                    await ch.set_permissions(guild.default_role, view_channel=False)
-                    await ch.set_permissions(role, view_channel=True, send_messages=True)
-                except Exception as e:
-                    log.warning("Failed to set channel overwrite: channel=%s err=%s", ch.id, e)
+            get_resolver().remember_channel(channel)
+
+        # Auth channel open to everyone; optionally hide other channels from @everyone, allow Verified.
+        # Only overwrites that differ from the cached state are written.
+        plan = plan_overwrites(guild, role, channel, hide_others)
+        if plan:
+            await self._apply_overwrite_plan(ctx, plan)
 
         await interaction.followup.send(
-            t("setup_complete", get_lang(guild.id, interaction.user.id), role=role.mention, channel=channel.mention), 
+            ctx.t("setup_complete", role=role.mention, channel=channel.mention),
             ephemeral=True
         )
 
@@ -216,302 +449,327 @@ class AuthCommands(app_commands.Group, name="auth", description="🛡️ 身份
 
     async def _post_welcome_message(self, channel: discord.TextChannel, guild: discord.Guild):
         """发送欢迎消息和快捷操作按钮"""
-        bot = self.bot
-        
-        class WelcomeView(discord.ui.View):
-            def __init__(self) -> None:
-                super().__init__(timeout=None)
-
-            @discord.ui.button(label="🔐 登录验证 / Login", style=discord.ButtonStyle.success, custom_id="quick_login", row=0)
-            async def quick_login(self, btn_interaction: Interaction, button: discord.ui.Button):
-                # Check if already verified
-                member = guild.get_member(btn_interaction.user.id)
-                if member:
-                    role = discord.utils.get(guild.roles, name=get_role_name())
-                    if role and role in member.roles:
-                        await btn_interaction.response.send_message(
-                            t("already_verified", get_lang(guild.id, btn_interaction.user.id)), 
-                            ephemeral=True
-                        )
-                        return
-
-                base = os.getenv("AUTH_API_BASE")
-                if not base:
-                    await btn_interaction.response.send_message(
-                        t("api_not_config", get_lang(guild.id, btn_interaction.user.id)), 
-                        ephemeral=True
-                    )
-                    return
-
-                api = AuthAPI(base)
-                modal = create_login_modal(guild, btn_interaction, api)
-                await btn_interaction.response.send_modal(modal)
-
-            @discord.ui.button(label="🇨🇳 中文", style=discord.ButtonStyle.secondary, custom_id="lang_zh", row=1)
-            async def zh(self, btn_interaction: Interaction, button: discord.ui.Button):
-                set_lang(guild.id, btn_interaction.user.id, "zh")
-                await btn_interaction.response.send_message(t("lang_set_zh", "zh"), ephemeral=True)
-
-            @discord.ui.button(label="🇺🇸 English", style=discord.ButtonStyle.secondary, custom_id="lang_en", row=1)
-            async def en(self, btn_interaction: Interaction, button: discord.ui.Button):
-                set_lang(guild.id, btn_interaction.user.id, "en")
-                await btn_interaction.response.send_message(t("lang_set_en", "en"), ephemeral=True)
-
-        embed = discord.Embed(
-            title="🔐 身份验证 / Authentication",
-            description=t("welcome_message", "zh"),
-            color=discord.Color.blue()
-        )
-        embed.add_field(
-            name="📋 使用说明 / Instructions",
-            value=t("welcome_instructions", "zh"),
-            inline=False
-        )
-        embed.set_footer(text="AuthBot • 点击按钮开始验证")
-
         try:
-            await channel.send(embed=embed, view=WelcomeView())
+            await channel.send(embed=get_embed("welcome", "zh"), view=get_welcome_view())
         except Exception as e:
             log.warning("Failed to send welcome message: %s", e)
 
     @setup.error
     async def setup_error(self, interaction: Interaction, error: Exception):
-        from discord.app_commands.errors import MissingPermissions
-        if isinstance(error, MissingPermissions):
-            await interaction.response.send_message(
-                t("missing_admin", get_lang(interaction.guild.id if interaction.guild else 0, interaction.user.id)), 
-                ephemeral=True
-            )
-        else:
-            if interaction.response.is_done():
-                await interaction.followup.send(
-                    t("generic_error", get_lang(interaction.guild.id if interaction.guild else 0, interaction.user.id)), 
-                    ephemeral=True
-                )
-            else:
-                await interaction.response.send_message(
-                    t("generic_error", get_lang(interaction.guild.id if interaction.guild else 0, interaction.user.id)), 
-                    ephemeral=True
-                )
+        await _send_error(interaction, error)
 
     @app_commands.command(name="revoke", description="🚫 撤销用户验证 / Revoke verification")
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(member="要撤销的成员 / Member to revoke")
     async def revoke(self, interaction: Interaction, member: discord.Member):
-        guild = interaction.guild
+        ctx = await AuthContext.from_interaction(interaction)
+        guild = ctx.guild
         if guild is None:
-            await interaction.response.send_message(t("must_use_in_server", get_lang(0, interaction.user.id)), ephemeral=True)
+            await interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
             return
         await interaction.response.defer(ephemeral=True, thinking=True)
 
         role_name = get_role_name()
-        role = discord.utils.get(guild.roles, name=role_name)
+        role = ctx.role(role_name)
         removed_role = False
-        if role and role in member.roles:
+        # member 来自本次命令的交互载荷，角色列表是最新的
+        roles = roles_after(member, add=_unverified_role(ctx), remove=role) if role in member.roles else None
+        if roles is not None:
             try:
-                await member.remove_roles(role, reason="Verification revoked by admin")
+                await member.edit(roles=roles, reason="Verification revoked by admin")
                 removed_role = True
             except Exception:
                 pass
 
-        removed_db = revoke_verified(guild.id, member.id)
+        removed_db = await get_async_db().revoke_verified(guild.id, member.id)
 
-        msg = t("revoke_success", get_lang(guild.id, interaction.user.id), member=member.mention)
+        msg = ctx.t("revoke_success", member=member.mention)
         if removed_role:
-            msg += t("revoke_role_removed", get_lang(guild.id, interaction.user.id))
+            msg += ctx.t("revoke_role_removed")
         if removed_db:
-            msg += t("revoke_record_cleared", get_lang(guild.id, interaction.user.id))
+            msg += ctx.t("revoke_record_cleared")
 
         await interaction.followup.send(msg, ephemeral=True)
 
     @revoke.error
     async def revoke_error(self, interaction: Interaction, error: Exception):
-        from discord.app_commands.errors import MissingPermissions
-        if isinstance(error, MissingPermissions):
-            await interaction.response.send_message(
-                t("missing_admin", get_lang(interaction.guild.id if interaction.guild else 0, interaction.user.id)), 
-                ephemeral=True
-            )
-        else:
-            if interaction.response.is_done():
-                await interaction.followup.send(
-                    t("generic_error", get_lang(interaction.guild.id if interaction.guild else 0, interaction.user.id)), 
-                    ephemeral=True
-                )
-            else:
-                await interaction.response.send_message(
-                    t("generic_error", get_lang(interaction.guild.id if interaction.guild else 0, interaction.user.id)), 
-                    ephemeral=True
-                )
+        await _send_error(interaction, error)
 
     @app_commands.command(name="list", description="📋 查看已验证用户 / List verified users")
     @app_commands.checks.has_permissions(administrator=True)
     async def list_verified(self, interaction: Interaction):
-        guild = interaction.guild
+        ctx = await AuthContext.from_interaction(interaction)
+        guild = ctx.guild
         if guild is None:
-            await interaction.response.send_message(t("must_use_in_server", get_lang(0, interaction.user.id)), ephemeral=True)
+            await interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
             return
 
         await interaction.response.defer(ephemeral=True)
-        
-        from .storage import get_verified_users
-        verified = get_verified_users(guild.id)
-        
-        if not verified:
-            await interaction.followup.send(t("no_verified_users", get_lang(guild.id, interaction.user.id)), ephemeral=True)
+
+        view = VerifiedListView(ctx)
+        embed = await view.load_page(None)
+        if embed is None:
+            await interaction.followup.send(ctx.t("no_verified_users"), ephemeral=True)
             return
 
-        lines = []
-        for user_id, info in verified.items():
-            username = info.get("username", "Unknown")
-            member = guild.get_member(int(user_id))
-            if member:
-                lines.append(f"• {member.mention} → `{username}`")
-            else:
-                lines.append(f"• <@{user_id}> → `{username}` (已离开)")
-        
-        embed = discord.Embed(
-            title=t("verified_list_title", get_lang(guild.id, interaction.user.id)),
-            description="\n".join(lines[:25]),
-            color=discord.Color.green()
-        )
-        if len(verified) > 25:
-            embed.set_footer(text=f"显示 25/{len(verified)} 条记录")
-        
-        await interaction.followup.send(embed=embed, ephemeral=True)
+        await interaction.followup.send(embed=embed, view=view, ephemeral=True)
 
     @list_verified.error
     async def list_verified_error(self, interaction: Interaction, error: Exception):
-        from discord.app_commands.errors import MissingPermissions
-        if isinstance(error, MissingPermissions):
-            await interaction.response.send_message(
-                t("missing_admin", get_lang(interaction.guild.id if interaction.guild else 0, interaction.user.id)), 
-                ephemeral=True
-            )
+        await _send_error(interaction, error, generic=False)
 
     @app_commands.command(name="panel", description="📨 发送验证面板卡片 / Send auth panel")
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(channel="发送到的频道 / Target channel (默认当前频道)")
     async def send_panel(self, interaction: Interaction, channel: Optional[discord.TextChannel] = None):
         """发送验证面板卡片到指定频道"""
-        guild = interaction.guild
+        ctx = await AuthContext.from_interaction(interaction)
+        guild = ctx.guild
         if guild is None:
-            await interaction.response.send_message(t("must_use_in_server", get_lang(0, interaction.user.id)), ephemeral=True)
+            await interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
             return
-        
+
         target_channel = channel or interaction.channel
         if not isinstance(target_channel, discord.TextChannel):
-            await interaction.response.send_message(t("invalid_channel", get_lang(guild.id, interaction.user.id)), ephemeral=True)
+            await interaction.response.send_message(ctx.t("invalid_channel"), ephemeral=True)
             return
-        
+
         await interaction.response.defer(ephemeral=True)
-        
+
         try:
             await self._post_welcome_message(target_channel, guild)
             await interaction.followup.send(
-                t("panel_sent", get_lang(guild.id, interaction.user.id), channel=target_channel.mention),
+                ctx.t("panel_sent", channel=target_channel.mention),
                 ephemeral=True
             )
         except discord.Forbidden:
-            await interaction.followup.send(
-                t("panel_no_permission", get_lang(guild.id, interaction.user.id)),
-                ephemeral=True
-            )
+            await interaction.followup.send(ctx.t("panel_no_permission"), ephemeral=True)
         except Exception as e:
             log.exception("Failed to send panel: %s", e)
-            await interaction.followup.send(
-                t("generic_error", get_lang(guild.id, interaction.user.id)),
-                ephemeral=True
-            )
+            await interaction.followup.send(ctx.t("generic_error"), ephemeral=True)
 
     @send_panel.error
     async def send_panel_error(self, interaction: Interaction, error: Exception):
-        from discord.app_commands.errors import MissingPermissions
-        if isinstance(error, MissingPermissions):
-            await interaction.response.send_message(
-                t("missing_admin", get_lang(interaction.guild.id if interaction.guild else 0, interaction.user.id)), 
+        await _send_error(interaction, error, generic=False)
+
+    @app_commands.command(name="reconcile", description="🔄 对齐验证记录与角色 / Reconcile verified records and roles")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        dry_run="只统计差异，不实际修改 / Only report the differences",
+        backfill="持有角色但没有记录的成员写入数据库，而不是移除角色 / Record role holders instead of removing the role",
+    )
+    async def reconcile(self, interaction: Interaction, dry_run: bool = False, backfill: bool = False):
+        """以数据库为准补发/移除验证角色"""
+        ctx = await AuthContext.from_interaction(interaction)
+        guild = ctx.guild
+        if guild is None:
+            await interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        role_name = get_role_name()
+        role = ctx.role(role_name)
+        if role is None:
+            await interaction.followup.send(ctx.t("reconcile_role_missing", role=role_name), ephemeral=True)
+            return
+
+        # 大服务器上对账可能超过交互令牌的 15 分钟有效期，进度写在同一条消息里，最终结果同时记入日志
+        progress_msg = await interaction.followup.send(
+            ctx.t("reconcile_progress", checked=0, add=0, remove=0), ephemeral=True, wait=True
+        )
+
+        async def report_progress(report: ReconcileReport) -> None:
+            await progress_msg.edit(content=ctx.t(
+                "reconcile_progress", checked=report.checked, add=report.add_role, remove=report.remove_role,
+            ))
+
+        reconciler = RoleReconciler(
+            get_async_db(),
+            concurrency=get_config().reconcile_concurrency,
+            progress=report_progress,
+        )
+        report = await reconciler.run(guild, role, dry_run=dry_run, backfill=backfill,
+                                      unverified=_unverified_role(ctx))
+        try:
+            await progress_msg.edit(content=ctx.t(
+                "reconcile_report",
+                prefix=ctx.t("reconcile_dry_run" if dry_run else "reconcile_done"),
+                checked=report.checked,
+                add=report.add_role,
+                remove=report.remove_role,
+                backfill=report.backfilled,
+                missing=report.missing_members,
+                failed=report.failed,
+            ))
+        except discord.HTTPException as e:
+            log.warning("Could not deliver reconcile report for guild %s (interaction expired?): %s %s",
+                        guild.id, report, e)
+
+    @reconcile.error
+    async def reconcile_error(self, interaction: Interaction, error: Exception):
+        await _send_error(interaction, error)
+
+    @app_commands.command(name="shards", description="📡 查看分片状态 / Show shard status")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def shards(self, interaction: Interaction):
+        """列出本进程各分片的延迟与服务器数"""
+        ctx = await AuthContext.from_interaction(interaction)
+        shard_stats = getattr(interaction.client, "shard_stats", None)
+        stats = shard_stats() if shard_stats is not None else []
+        current = ctx.guild.shard_id if ctx.guild else None
+        lines = [ctx.t("shards_header", count=len(stats))]
+        for stat in stats:
+            latency = stat["latency"]
+            lines.append(ctx.t(
+                "shards_line",
+                shard=stat["shard_id"],
+                latency="-" if latency != latency else f"{latency * 1000:.0f}",  # 尚未收到心跳时为 NaN
+                guilds=stat["guilds"],
+                state=ctx.t("shards_closed" if stat["closed"] else "shards_open"),
+                here=" ⬅" if stat["shard_id"] == current else "",
+            ))
+        await interaction.response.send_message("\n".join(lines)[:2000], ephemeral=True)
+
+    @shards.error
+    async def shards_error(self, interaction: Interaction, error: Exception):
+        await _send_error(interaction, error)
+
+    @app_commands.command(name="export", description="📤 导出已验证用户 / Export verified users")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(format="导出格式 / Export format")
+    @app_commands.choices(format=[
+        app_commands.Choice(name="JSONL", value="jsonl"),
+        app_commands.Choice(name="CSV", value="csv"),
+    ])
+    async def export_verified(self, interaction: Interaction, format: Optional[app_commands.Choice[str]] = None):
+        """把本服务器的验证记录流式写入临时文件后作为附件发送"""
+        ctx = await AuthContext.from_interaction(interaction)
+        guild = ctx.guild
+        if guild is None:
+            await interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        fmt = format.value if format else "jsonl"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f"verified-{guild.id}.{fmt}")
+            count = await export_guild(get_async_db(), path, fmt, guild.id)
+            await interaction.followup.send(
+                ctx.t("export_done", count=count),
+                file=discord.File(path),
                 ephemeral=True
             )
 
+    @export_verified.error
+    async def export_verified_error(self, interaction: Interaction, error: Exception):
+        await _send_error(interaction, error)
+
+    @app_commands.command(name="import", description="📥 导入已验证用户 / Import verified users")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(file="JSONL / CSV / 旧版 data.json 文件 / JSONL, CSV or legacy data.json")
+    async def import_verified(self, interaction: Interaction, file: discord.Attachment):
+        """批量导入验证记录，所有记录都写入当前服务器"""
+        ctx = await AuthContext.from_interaction(interaction)
+        guild = ctx.guild
+        if guild is None:
+            await interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        try:
+            data = await file.read()
+            count = await import_bytes(get_async_db(), data, detect_format(file.filename), guild.id)
+        except Exception as e:
+            log.exception("Import failed: guild=%s file=%s", guild.id, file.filename)
+            await interaction.followup.send(ctx.t("import_failed", error=str(e)), ephemeral=True)
+            return
+        log.info("Imported %d verified record(s) into guild %s", count, guild.id)
+        await interaction.followup.send(ctx.t("import_done", count=count), ephemeral=True)
+
+    @import_verified.error
+    async def import_verified_error(self, interaction: Interaction, error: Exception):
+        await _send_error(interaction, error)
+
 
 # ==================== 顶级斜杠命令（用户常用） ====================
 
 @app_commands.command(name="login", description="🔐 登录验证账号 / Login to verify")
 async def login_command(interaction: Interaction):
     """直接登录命令 - 用户最常用的命令"""
-    guild = interaction.guild
+    ctx = await AuthContext.from_interaction(interaction)
+    guild = ctx.guild
     if guild is None:
-        await interaction.response.send_message(t("must_use_in_server", get_lang(0, interaction.user.id)), ephemeral=True)
+        await interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
         return
 
     # Channel restriction check
-    restrict = _truthy(os.getenv("AUTH_LOGIN_CHANNEL_ONLY", "true"), default=True)
+    restrict = get_config().login_channel_only
     expected_channel = get_channel_name()
     if restrict:
         if not isinstance(interaction.channel, discord.TextChannel) or interaction.channel.name != expected_channel:
             log.info("Login rejected: user=%s channel=%s expected=%s", interaction.user.id, getattr(interaction.channel, 'name', '?'), expected_channel)
-            await interaction.response.send_message(
-                t("use_channel", get_lang(guild.id, interaction.user.id), channel=expected_channel), 
-                ephemeral=True
-            )
+            await interaction.response.send_message(ctx.t("use_channel", channel=expected_channel), ephemeral=True)
             return
 
     # Check if already verified
     role_name = get_role_name()
-    member = guild.get_member(interaction.user.id) or await guild.fetch_member(interaction.user.id)
-    verified_role = discord.utils.get(guild.roles, name=role_name)
-    if (verified_role and verified_role in member.roles) or is_verified(guild.id, member.id):
-        await interaction.response.send_message(t("already_verified", get_lang(guild.id, interaction.user.id)), ephemeral=True)
+    member = await ctx.get_member()
+    verified_role = ctx.role(role_name)
+    if (verified_role and verified_role in member.roles) or await get_async_db().is_verified(guild.id, member.id):
+        await interaction.response.send_message(ctx.t("already_verified"), ephemeral=True)
+        return
+
+    api = get_auth_api(interaction)
+    if api is None:
+        await interaction.response.send_message(ctx.t("api_not_config"), ephemeral=True)
         return
 
-    base = os.getenv("AUTH_API_BASE")
-    if not base:
-        await interaction.response.send_message(t("api_not_config", get_lang(guild.id, interaction.user.id)), ephemeral=True)
+    wait = get_login_limiter().retry_after(guild.id, interaction.user.id)
+    if wait > 0:
+        await interaction.response.send_message(ctx.t("rate_limited", seconds=math.ceil(wait)), ephemeral=True)
         return
 
-    api = AuthAPI(base)
-    modal = create_login_modal(guild, interaction, api)
+    modal = create_login_modal(ctx, api)
     await interaction.response.send_modal(modal)
 
 
 @app_commands.command(name="status", description="📊 查看验证状态 / Check verification status")
 async def status_command(interaction: Interaction):
     """查看当前用户的验证状态"""
-    guild = interaction.guild
+    ctx = await AuthContext.from_interaction(interaction)
+    guild = ctx.guild
     if guild is None:
-        await interaction.response.send_message(t("must_use_in_server", get_lang(0, interaction.user.id)), ephemeral=True)
+        await interaction.response.send_message(ctx.t("must_use_in_server"), ephemeral=True)
         return
 
-    member = guild.get_member(interaction.user.id)
+    member = ctx.member
     role_name = get_role_name()
-    role = discord.utils.get(guild.roles, name=role_name)
-    
+    role = ctx.role(role_name)
+
     has_role = role and member and role in member.roles
-    user_info = get_user_info(guild.id, interaction.user.id)
-    
-    lang = get_lang(guild.id, interaction.user.id)
-    
+    user_info = await get_async_db().get_user_info(guild.id, interaction.user.id)
+
     if has_role or user_info:
         username = user_info.get("username", "Unknown") if user_info else "Unknown"
         embed = discord.Embed(
-            title="✅ " + t("status_verified_title", lang),
-            description=t("status_verified_desc", lang, username=username),
+            title="✅ " + ctx.t("status_verified_title"),
+            description=ctx.t("status_verified_desc", username=username),
             color=discord.Color.green()
         )
         if has_role and role:
-            embed.add_field(name=t("status_role", lang), value=role.mention, inline=True)
+            embed.add_field(name=ctx.t("status_role"), value=role.mention, inline=True)
     else:
         embed = discord.Embed(
-            title="❌ " + t("status_unverified_title", lang),
-            description=t("status_unverified_desc", lang),
+            title="❌ " + ctx.t("status_unverified_title"),
+            description=ctx.t("status_unverified_desc"),
             color=discord.Color.red()
         )
         embed.add_field(
-            name=t("status_how_to", lang), 
-            value=t("status_how_to_desc", lang), 
+            name=ctx.t("status_how_to"),
+            value=ctx.t("status_how_to_desc"),
             inline=False
         )
-    
+
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
@@ -524,8 +782,8 @@ async def status_command(interaction: Interaction):
 async def lang_command(interaction: Interaction, language: app_commands.Choice[str]):
     """快捷语言切换命令"""
     guild_id = interaction.guild.id if interaction.guild else 0
-    set_lang(guild_id, interaction.user.id, language.value)
-    
+    await set_lang(guild_id, interaction.user.id, language.value)
+
     if language.value == "zh":
         await interaction.response.send_message(t("lang_set_zh", "zh"), ephemeral=True)
     else:
@@ -535,41 +793,9 @@ async def lang_command(interaction: Interaction, language: app_commands.Choice[s
 @app_commands.command(name="help", description="❓ 显示帮助信息 / Show help")
 async def help_command(interaction: Interaction):
     """显示完整的帮助信息"""
-    guild_id = interaction.guild.id if interaction.guild else 0
-    lang = get_lang(guild_id, interaction.user.id)
-    
-    embed = discord.Embed(
-        title="🤖 AuthBot " + t("help_title", lang),
-        description=t("help_description", lang),
-        color=discord.Color.blue()
-    )
-    
-    # User commands
-    embed.add_field(
-        name="👤 " + t("help_user_commands", lang),
-        value=(
-            "`/login` - " + t("help_login_desc", lang) + "\n"
-            "`/status` - " + t("help_status_desc", lang) + "\n"
-            "`/lang` - " + t("help_lang_desc", lang) + "\n"
-            "`/help` - " + t("help_help_desc", lang)
-        ),
-        inline=False
-    )
-    
-    # Admin commands
-    embed.add_field(
-        name="🛡️ " + t("help_admin_commands", lang),
-        value=(
-            "`/auth setup` - " + t("help_setup_desc", lang) + "\n"
-            "`/auth revoke` - " + t("help_revoke_desc", lang) + "\n"
-            "`/auth list` - " + t("help_list_desc", lang) + "\n"
-            "`/auth panel` - " + t("help_panel_desc", lang)
-        ),
-        inline=False
-    )
-    
-    embed.set_footer(text="AuthBot v1.0 • github.com/mhya123/DiscordAuthBot")
-    
+    ctx = await AuthContext.from_interaction(interaction)
+
+    embed = get_embed("help", ctx.lang)
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
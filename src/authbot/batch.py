@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Iterator, Optional, Tuple
+
+log = logging.getLogger("authbot.batch")
+
+# (描述, 无参协程工厂)；工厂在真正执行时才创建协程，避免一次性生成全部请求
+Job = Tuple[str, Callable[[], Awaitable[object]]]
+ProgressCallback = Callable[["BatchResult"], Awaitable[None]]
+
+
+@dataclass
+class BatchResult:
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+
+    @property
+    def finished(self) -> int:
+        return self.done + self.failed
+
+
+class BatchExecutor:
+    """以有限并发执行一批 Discord API 调用
+
+    discord.py 的 HTTP 层已经按路由 bucket 排队并处理 429，这里只限制同时在途的
+    请求数，使总耗时取决于速率限制而不是“往返延迟 × 请求数”。每隔
+    ``progress_interval`` 秒回调一次进度。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 5,
+        progress: Optional[ProgressCallback] = None,
+        progress_interval: float = 3.0,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+    async def run(self, jobs: Iterable[Job], total: Optional[int] = None) -> BatchResult:
+        result = BatchResult(total=total if total is not None else 0)
+        if total is None and hasattr(jobs, "__len__"):
+            result.total = len(jobs)  # type: ignore[arg-type]
+        it: Iterator[Job] = iter(jobs)
+        last_report = time.monotonic()
+
+        async def worker() -> None:
+            nonlocal last_report
+            for label, factory in it:
+                try:
+                    await factory()
+                    result.done += 1
+                except Exception as e:
+                    result.failed += 1
+                    log.warning("Batch job failed: %s err=%s", label, e)
+                now = time.monotonic()
+                if self.progress is not None and now - last_report >= self.progress_interval:
+                    last_report = now
+                    try:
+                        await self.progress(result)
+                    except Exception as e:
+                        log.debug("Progress callback failed: %s", e)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return result
@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Iterator, Optional, Set, Tuple
+
+from .storage import DatabaseBackend, LangRecord, TimedVerifiedRecord, VerifiedPage, VerifiedRecord
+
+log = logging.getLogger("authbot.cache")
+
+_MISSING = object()
+
+
+class TTLCache:
+    """线程安全的有界 LRU 缓存，条目在 ttl 秒后过期
+
+    未命中后回源读取的结果用 reserve() / fill() 写回：读取期间该键被 set() 或
+    pop() 过时，说明读到的可能是写入前的旧值，fill() 会放弃写回。
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # 键 → 正在回源读取的票据；只在读取期间存在
+        self._pending: Dict[Hashable, Set[object]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = _MISSING, count_miss: bool = True) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            if count_miss:
+                self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+            self._store(key, value)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+            self._data.pop(key, None)
+
+    def reserve(self, key: Hashable) -> object:
+        """登记一次回源读取，返回交给 fill() 或 release() 的票据"""
+        ticket = object()
+        with self._lock:
+            self._pending.setdefault(key, set()).add(ticket)
+        return ticket
+
+    def fill(self, key: Hashable, value: Any, ticket: object) -> bool:
+        """写回回源读取的结果；读取期间该键被写过时放弃并返回 False"""
+        with self._lock:
+            if not self._release(key, ticket):
+                return False
+            self._store(key, value)
+            return True
+
+    def release(self, key: Hashable, ticket: object) -> None:
+        """回源读取失败时注销票据"""
+        with self._lock:
+            self._release(key, ticket)
+
+    def _release(self, key: Hashable, ticket: object) -> bool:
+        tickets = self._pending.get(key)
+        if tickets is None or ticket not in tickets:
+            return False
+        tickets.discard(ticket)
+        if not tickets:
+            del self._pending[key]
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class GuildIndex:
+    """单个服务器的验证状态与非默认语言偏好
+
+    预热后可直接回答 is_verified / get_lang，以及 get_user_info 的“未验证”结果；
+    只保存用户 ID，用户名与验证时间仍从 TTL 缓存或数据库读取。
+    """
+
+    __slots__ = ("verified", "langs", "touched")
+
+    def __init__(self) -> None:
+        self.verified: Set[int] = set()
+        self.langs: Dict[int, str] = {}  # 只保存非默认语言
+        # 预热期间被写入过的用户；加载旧快照时跳过它们，以写入结果为准
+        self.touched: Optional[Set[int]] = set()
+
+    def set_verified(self, user_id: int) -> None:
+        self.verified.add(user_id)
+        self._touch(user_id)
+
+    def remove_verified(self, user_id: int) -> None:
+        self.verified.discard(user_id)
+        self._touch(user_id)
+
+    def set_lang(self, user_id: int, lang: str) -> None:
+        if lang == "zh":
+            self.langs.pop(user_id, None)
+        else:
+            self.langs[user_id] = lang
+        self._touch(user_id)
+
+    def _touch(self, user_id: int) -> None:
+        if self.touched is not None:
+            self.touched.add(user_id)
+
+
+class CachedBackend(DatabaseBackend):
+    """在任意 DatabaseBackend 前加一层读缓存
+
+    缓存 get_lang / is_verified / get_user_info，写操作（set_lang、
+    mark_verified、revoke_verified）在落库后同步更新或失效对应条目；与写入并发的
+    回源读取不会用旧值覆盖缓存。
+    warm_guild() 预热过的服务器改由 GuildIndex 回答，不再受容量和 TTL 限制，
+    直到 drop_guild() 将其丢弃。
+    """
+
+    def __init__(self, backend: DatabaseBackend, maxsize: int = 10000, ttl: float = 60.0) -> None:
+        self.backend = backend
+        self._verified = TTLCache(maxsize, ttl)
+        self._info = TTLCache(maxsize, ttl)
+        self._lang = TTLCache(maxsize, ttl)
+        self._caches = {
+            "is_verified": self._verified,
+            "get_user_info": self._info,
+            "get_lang": self._lang,
+        }
+        self._guilds: Dict[int, GuildIndex] = {}
+        self._index_lock = threading.Lock()
+
+    def warm_guild(self, guild_id: int, batch_size: int = 1000) -> GuildIndex:
+        """流式读取一个服务器的验证记录和语言偏好，建立常驻内存索引
+
+        一次性在当前线程完成；AsyncDatabaseBackend.warm_guild 用下面几个步骤方法
+        按批提交到执行线程，期间的用户请求可以插队。
+        """
+        index = self.begin_warm(guild_id)
+        if index is None:
+            return self._guilds[guild_id]
+        try:
+            self.load_verified(index, (row["user_id"] for row in self.backend.iter_verified(guild_id, batch_size)))
+            self.load_langs(index, self.backend.iter_langs(guild_id, batch_size))
+        except BaseException:
+            self.abort_warm(guild_id, index)
+            raise
+        self.finish_warm(guild_id, index)
+        return index
+
+    def begin_warm(self, guild_id: int) -> Optional[GuildIndex]:
+        """登记一个待预热的索引；已预热或正在预热时返回 None"""
+        with self._index_lock:
+            if guild_id in self._guilds:
+                return None
+            index = self._guilds[guild_id] = GuildIndex()
+            return index
+
+    def load_verified(self, index: GuildIndex, user_ids: Iterable[int]) -> None:
+        with self._index_lock:
+            for user_id in user_ids:
+                if user_id not in index.touched:
+                    index.verified.add(user_id)
+
+    def load_langs(self, index: GuildIndex, records: Iterable[LangRecord]) -> None:
+        with self._index_lock:
+            for _, user_id, lang in records:
+                if lang != "zh" and user_id not in index.touched:
+                    index.langs[user_id] = lang
+
+    def finish_warm(self, guild_id: int, index: GuildIndex) -> None:
+        with self._index_lock:
+            index.touched = None
+        log.info("Warmed guild %s: %d verified, %d lang pref(s)", guild_id, len(index.verified), len(index.langs))
+
+    def abort_warm(self, guild_id: int, index: GuildIndex) -> None:
+        with self._index_lock:
+            if self._guilds.get(guild_id) is index:
+                del self._guilds[guild_id]
+
+    def drop_guild(self, guild_id: int) -> bool:
+        """丢弃一个服务器的内存索引（机器人离开该服务器时调用）"""
+        with self._index_lock:
+            return self._guilds.pop(guild_id, None) is not None
+
+    def _index(self, guild_id: int) -> Optional[GuildIndex]:
+        """返回已完成预热的索引（预热中的不算）"""
+        index = self._guilds.get(guild_id)
+        if index is None or index.touched is not None:
+            return None
+        return index
+
+    def _from_index(self, method: str, guild_id: int, user_id: int) -> Tuple[bool, Any]:
+        index = self._index(guild_id)
+        if index is None:
+            return False, None
+        if method == "is_verified":
+            return True, user_id in index.verified
+        if method == "get_user_info" and user_id not in index.verified:
+            return True, None
+        if method == "get_lang":
+            return True, index.langs.get(user_id, "zh")
+        return False, None
+
+    def _update_index(self, guild_id: int, apply) -> None:
+        with self._index_lock:
+            index = self._guilds.get(guild_id)
+            if index is not None:
+                apply(index)
+
+    @property
+    def executor_workers(self) -> int:
+        return self.backend.executor_workers
+
+    def peek(self, method: str, guild_id: int, user_id: int) -> Tuple[bool, Any]:
+        """仅查询缓存，不访问数据库；返回 (是否命中, 值)"""
+        cache = self._caches.get(method)
+        if cache is None:
+            return False, None
+        hit, value = self._from_index(method, guild_id, user_id)
+        if hit:
+            return hit, value
+        # 未命中会由随后的后端调用计数，这里不重复统计
+        value = cache.get((guild_id, user_id), count_miss=False)
+        if value is _MISSING:
+            return False, None
+        if isinstance(value, dict):
+            value = dict(value)
+        return True, value
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {name: cache.stats() for name, cache in self._caches.items()}
+        stats["warm_guilds"] = {
+            "guilds": len(self._guilds),
+            "verified": sum(len(i.verified) for i in self._guilds.values()),
+            "langs": sum(len(i.langs) for i in self._guilds.values()),
+        }
+        return stats
+
+    def init_tables(self) -> None:
+        self.backend.init_tables()
+
+    def is_verified(self, guild_id: int, user_id: int) -> bool:
+        hit, value = self._from_index("is_verified", guild_id, user_id)
+        if hit:
+            return value
+        key = (guild_id, user_id)
+        value = self._verified.get(key)
+        if value is _MISSING:
+            ticket = self._verified.reserve(key)
+            try:
+                value = self.backend.is_verified(guild_id, user_id)
+            except BaseException:
+                self._verified.release(key, ticket)
+                raise
+            self._verified.fill(key, value, ticket)
+        return value
+
+    def mark_verified(self, guild_id: int, user_id: int, username: str) -> None:
+        key = (guild_id, user_id)
+        self.backend.mark_verified(guild_id, user_id, username)
+        self._verified.set(key, True)
+        self._info.pop(key)
+        self._update_index(guild_id, lambda index: index.set_verified(user_id))
+
+    def revoke_verified(self, guild_id: int, user_id: int) -> bool:
+        key = (guild_id, user_id)
+        removed = self.backend.revoke_verified(guild_id, user_id)
+        self._verified.set(key, False)
+        self._info.set(key, None)
+        self._update_index(guild_id, lambda index: index.remove_verified(user_id))
+        return removed
+
+    def get_user_info(self, guild_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        hit, value = self._from_index("get_user_info", guild_id, user_id)
+        if hit:
+            return value
+        key = (guild_id, user_id)
+        value = self._info.get(key)
+        if value is _MISSING:
+            info_ticket = self._info.reserve(key)
+            verified_ticket = self._verified.reserve(key)
+            try:
+                value = self.backend.get_user_info(guild_id, user_id)
+            except BaseException:
+                self._info.release(key, info_ticket)
+                self._verified.release(key, verified_ticket)
+                raise
+            self._info.fill(key, value, info_ticket)
+            self._verified.fill(key, value is not None, verified_ticket)
+        return dict(value) if value is not None else None
+
+    def get_verified_users(self, guild_id: int) -> Dict[str, Dict[str, Any]]:
+        return self.backend.get_verified_users(guild_id)
+
+    def get_verified_page(self, guild_id: int, after: Optional[int] = None, limit: int = 25) -> VerifiedPage:
+        return self.backend.get_verified_page(guild_id, after, limit)
+
+    def count_verified(self, guild_id: int) -> int:
+        return self.backend.count_verified(guild_id)
+
+    def mark_verified_many(self, records: Iterable[VerifiedRecord]) -> int:
+        records = list(records)
+        written = self.backend.mark_verified_many(records)
+        for guild_id, user_id, _ in records:
+            self._verified.set((guild_id, user_id), True)
+            self._info.pop((guild_id, user_id))
+            self._update_index(guild_id, lambda index: index.set_verified(user_id))
+        return written
+
+    def restore_verified_many(self, records: Iterable[TimedVerifiedRecord]) -> int:
+        records = list(records)
+        written = self.backend.restore_verified_many(records)
+        for guild_id, user_id, _, _ in records:
+            self._verified.set((guild_id, user_id), True)
+            self._info.pop((guild_id, user_id))
+            self._update_index(guild_id, lambda index: index.set_verified(user_id))
+        return written
+
+    def revoke_verified_many(self, keys: Iterable[Tuple[int, int]]) -> int:
+        keys = list(keys)
+        removed = self.backend.revoke_verified_many(keys)
+        for guild_id, user_id in keys:
+            self._verified.set((guild_id, user_id), False)
+            self._info.set((guild_id, user_id), None)
+            self._update_index(guild_id, lambda index: index.remove_verified(user_id))
+        return removed
+
+    def iter_verified(self, guild_id: Optional[int] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        return self.backend.iter_verified(guild_id, batch_size)
+
+    def set_lang(self, guild_id: int, user_id: int, lang: str) -> None:
+        self.backend.set_lang(guild_id, user_id, lang)
+        self._lang.set((guild_id, user_id), lang)
+        self._update_index(guild_id, lambda index: index.set_lang(user_id, lang))
+
+    def get_lang(self, guild_id: int, user_id: int) -> str:
+        hit, value = self._from_index("get_lang", guild_id, user_id)
+        if hit:
+            return value
+        key = (guild_id, user_id)
+        value = self._lang.get(key)
+        if value is _MISSING:
+            ticket = self._lang.reserve(key)
+            try:
+                value = self.backend.get_lang(guild_id, user_id)
+            except BaseException:
+                self._lang.release(key, ticket)
+                raise
+            self._lang.fill(key, value, ticket)
+        return value
+
+    def set_lang_many(self, records: Iterable[LangRecord]) -> int:
+        records = list(records)
+        written = self.backend.set_lang_many(records)
+        for guild_id, user_id, lang in records:
+            self._lang.set((guild_id, user_id), lang)
+            self._update_index(guild_id, lambda index: index.set_lang(user_id, lang))
+        return written
+
+    def iter_langs(self, guild_id: Optional[int] = None, batch_size: int = 1000) -> Iterator[LangRecord]:
+        return self.backend.iter_langs(guild_id, batch_size)
+
+    def delete_langs_many(self, keys: Iterable[Tuple[int, int]]) -> int:
+        keys = list(keys)
+        removed = self.backend.delete_langs_many(keys)
+        for guild_id, user_id in keys:
+            self._lang.set((guild_id, user_id), "zh")
+            self._update_index(guild_id, lambda index: index.set_lang(user_id, "zh"))
+        return removed
+
+    def close(self) -> None:
+        log.info("Cache stats at shutdown: %s", self.stats())
+        self.backend.close()
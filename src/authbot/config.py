@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+
+def _truthy(val: Optional[str], default: bool = True) -> bool:
+    if val is None:
+        return default
+    return val.strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+@dataclass(frozen=True)
+class AuthConfig:
+    """验证流程相关配置，启动时从环境变量解析一次"""
+
+    role_name: str = "Verified"
+    channel_name: str = "auth-verify"
+    # 验证成功时一并移除的角色，未配置时为 None
+    unverified_role_name: Optional[str] = None
+    login_channel_only: bool = True
+    hide_other_channels: bool = True
+    setup_concurrency: int = 5
+    reconcile_concurrency: int = 5
+    member_cache_size: int = 5000
+    member_cache_ttl: float = 60.0
+
+    @classmethod
+    def from_env(cls) -> "AuthConfig":
+        return cls(
+            role_name=os.getenv("AUTH_SUCCESS_ROLE", "Verified"),
+            channel_name=os.getenv("AUTH_CHANNEL_NAME", "auth-verify"),
+            unverified_role_name=os.getenv("AUTH_UNVERIFIED_ROLE") or None,
+            login_channel_only=_truthy(os.getenv("AUTH_LOGIN_CHANNEL_ONLY"), default=True),
+            hide_other_channels=_truthy(os.getenv("AUTH_HIDE_OTHER_CHANNELS"), default=True),
+            setup_concurrency=int(os.getenv("AUTH_SETUP_CONCURRENCY", "5")),
+            reconcile_concurrency=int(os.getenv("AUTH_RECONCILE_CONCURRENCY", "5")),
+            member_cache_size=int(os.getenv("AUTH_MEMBER_CACHE_SIZE", "5000")),
+            member_cache_ttl=float(os.getenv("AUTH_MEMBER_CACHE_TTL", "60")),
+        )
+
+
+_config: Optional[AuthConfig] = None
+
+
+def get_config() -> AuthConfig:
+    global _config
+    if _config is None:
+        _config = AuthConfig.from_env()
+    return _config
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+import discord
+from discord import Interaction
+
+from .i18n import t
+from .members import get_member_resolver
+from .prefs import get_lang
+from .resolver import get_resolver
+
+
+class AuthContext:
+    """单次交互的请求上下文
+
+    在处理开始时解析一次用户语言和成员对象，之后的所有文本、角色查找都复用
+    这里的结果，避免每条消息都重新查询数据库或扫描角色列表。
+    """
+
+    __slots__ = ("interaction", "guild", "lang", "member", "_roles")
+
+    def __init__(self, interaction: Interaction, lang: str, member: Optional[discord.Member] = None) -> None:
+        self.interaction = interaction
+        self.guild: Optional[discord.Guild] = interaction.guild
+        self.lang = lang
+        self.member = member
+        self._roles: Dict[str, Optional[discord.Role]] = {}
+
+    @classmethod
+    async def from_interaction(cls, interaction: Interaction) -> "AuthContext":
+        guild = interaction.guild
+        lang = await get_lang(guild.id if guild else 0, interaction.user.id)
+        member: Optional[discord.Member] = None
+        if isinstance(interaction.user, discord.Member):
+            member = interaction.user
+        elif guild is not None:
+            member = get_member_resolver().peek(guild, interaction.user.id)
+        return cls(interaction, lang, member)
+
+    @property
+    def guild_id(self) -> int:
+        return self.guild.id if self.guild else 0
+
+    @property
+    def user_id(self) -> int:
+        return self.interaction.user.id
+
+    def t(self, key: str, **kwargs: Any) -> str:
+        """以当前用户的语言翻译文本"""
+        return t(key, self.lang, **kwargs)
+
+    def role(self, name: str) -> Optional[discord.Role]:
+        """按名称查找角色，经由服务器级解析缓存，同一上下文内只解析一次"""
+        if self.guild is None:
+            return None
+        if name not in self._roles:
+            self._roles[name] = get_resolver().role(self.guild, name)
+        return self._roles[name]
+
+    def remember_role(self, name: str, role: discord.Role) -> None:
+        self._roles[name] = role
+        get_resolver().remember_role(role)
+
+    async def get_member(self) -> Optional[discord.Member]:
+        """获取发起交互的成员，缓存未命中时才请求 API（同一用户的并发请求会合并）"""
+        if self.member is None and self.guild is not None:
+            self.member = await get_member_resolver().get(self.guild, self.user_id)
+        return self.member
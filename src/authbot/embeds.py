@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Optional, Tuple
+
+import discord
+
+from .i18n import get_catalog, t
+
+EmbedBuilder = Callable[[str], discord.Embed]
+
+_builders: Dict[str, EmbedBuilder] = {}
+# (名称, 语言标签) → 已渲染的 Embed
+_cache: Dict[Tuple[str, Optional[str]], discord.Embed] = {}
+_generation = -1
+
+
+def embed_builder(name: str) -> Callable[[EmbedBuilder], EmbedBuilder]:
+    def decorator(func: EmbedBuilder) -> EmbedBuilder:
+        _builders[name] = func
+        return func
+    return decorator
+
+
+def get_embed(name: str, lang: Optional[str]) -> discord.Embed:
+    """按语言取得预先渲染好的 Embed
+
+    返回的对象在多次发送之间共享，调用方不得修改；需要改动时请先 .copy()。
+    翻译目录 reload() 后缓存整体失效。
+    """
+    global _generation
+    generation = get_catalog().generation
+    if generation != _generation:
+        _cache.clear()
+        _generation = generation
+    key = (name, lang)
+    embed = _cache.get(key)
+    if embed is None:
+        embed = _builders[name](lang or "")
+        _cache[key] = embed
+    return embed
+
+
+@embed_builder("help")
+def _help_embed(lang: str) -> discord.Embed:
+    embed = discord.Embed(
+        title="🤖 AuthBot " + t("help_title", lang),
+        description=t("help_description", lang),
+        color=discord.Color.blue()
+    )
+
+    # User commands
+    embed.add_field(
+        name="👤 " + t("help_user_commands", lang),
+        value=(
+            "`/login` - " + t("help_login_desc", lang) + "\n"
+            "`/status` - " + t("help_status_desc", lang) + "\n"
+            "`/lang` - " + t("help_lang_desc", lang) + "\n"
+            "`/help` - " + t("help_help_desc", lang)
+        ),
+        inline=False
+    )
+
+    # Admin commands
+    embed.add_field(
+        name="🛡️ " + t("help_admin_commands", lang),
+        value=(
+            "`/auth setup` - " + t("help_setup_desc", lang) + "\n"
+            "`/auth revoke` - " + t("help_revoke_desc", lang) + "\n"
+            "`/auth list` - " + t("help_list_desc", lang) + "\n"
+            "`/auth panel` - " + t("help_panel_desc", lang) + "\n"
+            "`/auth reconcile` - " + t("help_reconcile_desc", lang) + "\n"
+            "`/auth import` - " + t("help_import_desc", lang) + "\n"
+            "`/auth export` - " + t("help_export_desc", lang) + "\n"
+            "`/auth shards` - " + t("help_shards_desc", lang)
+        ),
+        inline=False
+    )
+
+    embed.set_footer(text="AuthBot v1.0 • github.com/mhya123/DiscordAuthBot")
+    return embed
+
+
+@embed_builder("welcome")
+def _welcome_embed(lang: str) -> discord.Embed:
+    embed = discord.Embed(
+        title="🔐 身份验证 / Authentication",
+        description=t("welcome_message", lang),
+        color=discord.Color.blue()
+    )
+    embed.add_field(
+        name="📋 使用说明 / Instructions",
+        value=t("welcome_instructions", lang),
+        inline=False
+    )
+    embed.set_footer(text="AuthBot • 点击按钮开始验证")
+    return embed
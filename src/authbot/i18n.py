@@ -1,248 +1,165 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+import json
+import logging
+import os
+import string
+from typing import Any, Dict, Optional, Tuple, Union
+
+log = logging.getLogger("authbot.i18n")
 
 DEFAULT_LANG = "zh"
+# 当前语言缺少某条文本时依次回退的语言
+FALLBACK_LANGS: Tuple[str, ...] = ("en", "zh")
 
-_messages: Dict[str, Dict[str, str]] = {
-    # ==================== 通用消息 ====================
-    "must_use_in_server": {
-        "zh": "此命令必须在服务器内使用。",
-        "en": "This command must be used in a server.",
-    },
-    "use_channel": {
-        "zh": "请在 #{channel} 中使用该命令。",
-        "en": "Please use this command in #{channel}.",
-    },
-    "generic_error": {
-        "zh": "运行此命令时发生错误。",
-        "en": "An error occurred while running this command.",
-    },
-
-    # ==================== 认证相关 ====================
-    "api_not_config": {
-        "zh": "认证 API 未配置。",
-        "en": "Auth API base is not configured.",
-    },
-    "already_verified": {
-        "zh": "你已通过验证，无需重复认证。",
-        "en": "You are already verified.",
-    },
-    "auth_failed_500": {
-        "zh": "账号或密码错误，请检查后重试。",
-        "en": "Incorrect username or password. Please check and try again.",
-    },
-    "auth_failed_generic": {
-        "zh": "认证失败，请稍后再试。",
-        "en": "Authentication failed. Please try again later.",
-    },
-    "auth_success": {
-        "zh": "✅ 已以 **{username}** 身份通过验证！已授予角色并更新昵称。",
-        "en": "✅ Authenticated as **{username}**! Role granted and nickname updated.",
-    },
-    "auth_request_failed": {
-        "zh": "认证请求失败：{error}",
-        "en": "Auth request failed: {error}",
-    },
-    "auth_partial_success": {
-        "zh": "已验证为 **{username}**，但是：{error}",
-        "en": "Authenticated as **{username}**, but: {error}",
-    },
-
-    # ==================== 登录模态框 ====================
-    "modal_title": {
-        "zh": "🔐 账号登录",
-        "en": "🔐 Account Login",
-    },
-    "modal_login_label": {
-        "zh": "登录名（用户名/邮箱）",
-        "en": "Login (username/email)",
-    },
-    "modal_login_placeholder": {
-        "zh": "请输入你的用户名或邮箱",
-        "en": "Enter your username or email",
-    },
-    "modal_password_label": {
-        "zh": "密码",
-        "en": "Password",
-    },
-
-    # ==================== Setup 相关 ====================
-    "setup_complete": {
-        "zh": "✅ 初始化完成！\n• 角色：{role}\n• 频道：{channel}\n\n已在验证频道发送欢迎消息。",
-        "en": "✅ Setup complete!\n• Role: {role}\n• Channel: {channel}\n\nWelcome message sent to auth channel.",
-    },
-    "welcome_message": {
-        "zh": "欢迎来到本服务器！请完成身份验证以获得完整访问权限。\n\nWelcome! Please verify your identity to get full access.",
-        "en": "Welcome to this server! Please verify your identity to get full access.\n\n欢迎！请完成身份验证以获得完整访问权限。",
-    },
-    "welcome_instructions": {
-        "zh": "1️⃣ 选择你的显示语言\n2️⃣ 点击「登录验证」按钮\n3️⃣ 输入你的账号和密码\n4️⃣ 验证成功后即可访问其他频道",
-        "en": "1️⃣ Choose your display language\n2️⃣ Click the 'Login' button\n3️⃣ Enter your credentials\n4️⃣ After verification, you can access other channels",
-    },
-
-    # ==================== 语言相关 ====================
-    "lang_prompt": {
-        "zh": "请选择显示语言 / Choose your language",
-        "en": "Choose your language / 请选择显示语言",
-    },
-    "lang_set_zh": {
-        "zh": "✅ 已切换为中文显示。",
-        "en": "✅ Switched to Chinese.",
-    },
-    "lang_set_en": {
-        "zh": "✅ 已切换为英文显示。",
-        "en": "✅ Switched to English.",
-    },
-
-    # ==================== 权限相关 ====================
-    "missing_admin": {
-        "zh": "⚠️ 需要管理员权限才能使用此命令。",
-        "en": "⚠️ You need Administrator permission to use this command.",
-    },
-    "guild_not_found": {
-        "zh": "找不到服务器。",
-        "en": "Guild not found.",
-    },
-    "role_create_failed": {
-        "zh": "无法创建/找到角色。",
-        "en": "Failed to create/find role.",
-    },
-    "role_permission_denied": {
-        "zh": "缺少分配角色的权限。请将机器人的角色提升到更高位置。",
-        "en": "Missing permission to assign roles. Move the bot's role higher.",
-    },
-    "role_assign_failed": {
-        "zh": "分配角色失败：{error}",
-        "en": "Failed to assign role: {error}",
-    },
-
-    # ==================== 撤销相关 ====================
-    "revoke_success": {
-        "zh": "✅ 已撤销 {member} 的验证。",
-        "en": "✅ Revoked verification for {member}.",
-    },
-    "revoke_role_removed": {
-        "zh": " 已移除角色。",
-        "en": " Removed role.",
-    },
-    "revoke_record_cleared": {
-        "zh": " 已清除记录。",
-        "en": " Cleared record.",
-    },
-
-    # ==================== 状态查询 ====================
-    "status_verified_title": {
-        "zh": "已验证",
-        "en": "Verified",
-    },
-    "status_verified_desc": {
-        "zh": "你已通过身份验证，账号名：**{username}**",
-        "en": "You are verified as **{username}**",
-    },
-    "status_role": {
-        "zh": "当前角色",
-        "en": "Current Role",
-    },
-    "status_unverified_title": {
-        "zh": "未验证",
-        "en": "Not Verified",
-    },
-    "status_unverified_desc": {
-        "zh": "你还没有完成身份验证。",
-        "en": "You have not completed verification yet.",
-    },
-    "status_how_to": {
-        "zh": "如何验证？",
-        "en": "How to verify?",
-    },
-    "status_how_to_desc": {
-        "zh": "使用 `/login` 命令或点击验证频道中的按钮开始验证。",
-        "en": "Use `/login` command or click the button in auth channel to start.",
-    },
-
-    # ==================== 用户列表 ====================
-    "no_verified_users": {
-        "zh": "暂无已验证用户。",
-        "en": "No verified users yet.",
-    },
-    "verified_list_title": {
-        "zh": "📋 已验证用户列表",
-        "en": "📋 Verified Users List",
-    },
-
-    # ==================== 帮助系统 ====================
-    "help_title": {
-        "zh": "使用帮助",
-        "en": "Help",
-    },
-    "help_description": {
-        "zh": "这是一个身份验证机器人，用于验证用户身份并授予相应权限。",
-        "en": "This is an authentication bot for verifying user identity and granting access.",
-    },
-    "help_user_commands": {
-        "zh": "用户命令",
-        "en": "User Commands",
-    },
-    "help_admin_commands": {
-        "zh": "管理员命令",
-        "en": "Admin Commands",
-    },
-    "help_login_desc": {
-        "zh": "登录验证账号",
-        "en": "Login to verify account",
-    },
-    "help_status_desc": {
-        "zh": "查看你的验证状态",
-        "en": "Check your verification status",
-    },
-    "help_lang_desc": {
-        "zh": "切换显示语言",
-        "en": "Switch display language",
-    },
-    "help_help_desc": {
-        "zh": "显示此帮助信息",
-        "en": "Show this help message",
-    },
-    "help_setup_desc": {
-        "zh": "初始化认证系统",
-        "en": "Initialize auth system",
-    },
-    "help_revoke_desc": {
-        "zh": "撤销用户的验证",
-        "en": "Revoke user verification",
-    },
-    "help_list_desc": {
-        "zh": "查看已验证用户列表",
-        "en": "List verified users",
-    },
-    "help_panel_desc": {
-        "zh": "发送验证面板卡片",
-        "en": "Send auth panel card",
-    },
-
-    # ==================== 验证面板 ====================
-    "panel_sent": {
-        "zh": "✅ 验证面板已发送到 {channel}",
-        "en": "✅ Auth panel sent to {channel}",
-    },
-    "panel_no_permission": {
-        "zh": "❌ 没有权限在该频道发送消息。",
-        "en": "❌ No permission to send messages in that channel.",
-    },
-    "invalid_channel": {
-        "zh": "❌ 无效的频道。",
-        "en": "❌ Invalid channel.",
-    },
-}
-
-
-def t(key: str, lang: str, **kwargs: Any) -> str:
-    """获取翻译文本"""
-    lang = (lang or DEFAULT_LANG).split("-")[0]
-    bundle = _messages.get(key, {})
-    template = bundle.get(lang) or bundle.get("en") or bundle.get("zh") or key
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+
+_formatter = string.Formatter()
+
+
+class Template:
+    """带占位符的文本，只在真正需要时调用 str.format"""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def render(self, kwargs: Dict[str, Any]) -> str:
+        try:
+            return self.text.format(**kwargs)
+        except Exception:
+            return self.text
+
+
+Entry = Union[str, Template]
+
+
+def compile_template(text: str) -> Entry:
+    """没有占位符的文本直接返回（已处理 {{ }} 转义），其余包装成 Template"""
     try:
-        return template.format(**kwargs)
-    except Exception:
-        return template
+        parts = list(_formatter.parse(text))
+    except ValueError:
+        return text
+    if all(field is None for _, field, _, _ in parts):
+        return "".join(literal for literal, _, _, _ in parts)
+    return Template(text)
+
+
+def _read_locale_file(path: str) -> Dict[str, str]:
+    if path.endswith(".toml"):
+        import tomllib  # Python 3.11+
+
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    return {str(k): str(v) for k, v in data.items()}
+
+
+class Catalog:
+    """按语言懒加载的翻译目录
+
+    locales/ 下每个语言一个 JSON 或 TOML 文件（键 → 文本）。某个语言第一次被
+    用到时才读盘，并与回退语言合并成一张扁平表，之后 t() 只需两次字典查找。
+    添加新语言只需放入新文件，不会增加启动时间。
+    """
+
+    def __init__(self, locale_dir: str = LOCALE_DIR, default: str = DEFAULT_LANG,
+                 fallbacks: Tuple[str, ...] = FALLBACK_LANGS) -> None:
+        self.locale_dir = locale_dir
+        self.default = default
+        self.fallbacks = fallbacks
+        self._raw: Dict[str, Dict[str, str]] = {}
+        # 原始语言标签（如 "zh-CN"、None）→ 编译后的表
+        self._tables: Dict[Optional[str], Dict[str, Entry]] = {}
+        self._available: Optional[Tuple[str, ...]] = None
+        # 每次 reload() 加一，依赖翻译文本的缓存据此判断是否过期
+        self.generation = 0
+
+    def reload(self) -> None:
+        """丢弃已加载的语言文件，下次使用时重新读盘"""
+        self._raw.clear()
+        self._tables.clear()
+        self._available = None
+        self.generation += 1
+
+    def available(self) -> Tuple[str, ...]:
+        if self._available is None:
+            try:
+                names = os.listdir(self.locale_dir)
+            except OSError:
+                names = []
+            self._available = tuple(sorted({
+                os.path.splitext(n)[0] for n in names if n.endswith((".json", ".toml"))
+            }))
+        return self._available
+
+    def _load(self, lang: str) -> Dict[str, str]:
+        raw = self._raw.get(lang)
+        if raw is None:
+            raw = {}
+            for ext in (".json", ".toml"):
+                path = os.path.join(self.locale_dir, lang + ext)
+                if os.path.exists(path):
+                    try:
+                        raw = _read_locale_file(path)
+                    except Exception:
+                        log.exception("Failed to load locale file %s", path)
+                    break
+            self._raw[lang] = raw
+        return raw
+
+    def normalize(self, lang: Optional[str]) -> str:
+        """归一化为可用的语言代码；不支持的语言依次回退到 fallbacks，最后是默认语言"""
+        available = self.available()
+        base = (lang or self.default).replace("_", "-").split("-")[0].lower()
+        if base in available:
+            return base
+        for code in self.fallbacks:
+            if code in available:
+                return code
+        return self.default
+
+    def table(self, lang: Optional[str]) -> Dict[str, Entry]:
+        table = self._tables.get(lang)
+        if table is None:
+            base = self.normalize(lang)
+            table = self._tables.get(base)
+            if table is None:
+                merged: Dict[str, str] = {}
+                for code in reversed((base,) + self.fallbacks):
+                    merged.update(self._load(code))
+                table = {key: compile_template(text) for key, text in merged.items()}
+                self._tables[base] = table
+            self._tables[lang] = table
+        return table
+
+    def t(self, key: str, lang: Optional[str], **kwargs: Any) -> str:
+        return _lookup(self.table(lang), key, kwargs)
+
+
+def _lookup(table: Dict[str, Entry], key: str, kwargs: Dict[str, Any]) -> str:
+    entry = table.get(key)
+    if entry is None:
+        return key
+    if entry.__class__ is str:
+        return entry  # type: ignore[return-value]
+    return entry.render(kwargs)  # type: ignore[union-attr]
+
+
+_catalog = Catalog()
+_tables = _catalog._tables
+
+
+def get_catalog() -> Catalog:
+    return _catalog
+
+
+def t(key: str, lang: Optional[str], **kwargs: Any) -> str:
+    """获取翻译文本"""
+    table = _tables.get(lang)
+    if table is None:
+        table = _catalog.table(lang)
+    return _lookup(table, key, kwargs)
@@ -1,14 +1,21 @@
+import argparse
 import asyncio
 import logging
 import os
-from typing import Optional
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
 
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
-from .auth_commands import register_commands
-from .storage import ensure_db_exists
+from .auth_api import AuthAPI
+from .auth_commands import get_welcome_view, register_commands
+from .config import get_config
+from .members import get_member_resolver
+from .resolver import get_resolver
+from .storage import SCHEMA_VERSION, ensure_db_exists, close_db, get_async_db, get_db
 
 log = logging.getLogger("authbot")
 
@@ -24,28 +31,173 @@ def _int_from_env(name: str) -> Optional[int]:
         return None
 
 
+def _shard_ids_from_env(name: str) -> Optional[List[int]]:
+    """解析 "0-3" 或 "0,2,5" 形式的分片列表"""
+    val = os.getenv(name, "").strip()
+    if not val:
+        return None
+    ids: List[int] = []
+    try:
+        for part in val.split(","):
+            part = part.strip()
+            if "-" in part:
+                lo, hi = part.split("-", 1)
+                ids.extend(range(int(lo), int(hi) + 1))
+            elif part:
+                ids.append(int(part))
+    except ValueError:
+        raise RuntimeError(f"{name} must look like '0-3' or '0,2,5', got {val!r}")
+    return sorted(set(ids))
+
+
+class AuthBotMixin:
+    """The shared resources and startup logic the command layer relies on.
+
+    Mixed into both commands.Bot and commands.AutoShardedBot so the sharded
+    and single-connection modes behave the same apart from the gateway.
+    """
+
+    def __init__(self, *args, auth_api: Optional[AuthAPI] = None, warmup: bool = False, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.auth_api = auth_api
+        self.warmup = warmup
+        self._warmed: set = set()
+
+    async def setup_hook(self) -> None:
+        # 持久视图：重启后已发送的欢迎面板按 custom_id 继续响应，无需重新发送
+        self.add_view(get_welcome_view())
+        if self.auth_api is not None:
+            self.auth_api.open()
+        else:
+            log.warning("AUTH_API_BASE is not set; /login will be unavailable")
+
+    @property
+    def owns_command_sync(self) -> bool:
+        """多个进程分别运行不同分片时，只由持有 0 号分片的进程同步斜杠命令"""
+        shard_ids = getattr(self, "shard_ids", None)
+        return shard_ids is None or 0 in shard_ids
+
+    def shard_stats(self) -> List[Dict[str, Any]]:
+        """本进程每个分片的延迟（秒）与服务器数"""
+        counts = Counter(guild.shard_id for guild in self.guilds)
+        shards = getattr(self, "shards", None)
+        if shards:
+            return [
+                {"shard_id": shard_id, "latency": info.latency, "guilds": counts.get(shard_id, 0),
+                 "closed": info.is_closed()}
+                for shard_id, info in sorted(shards.items())
+            ]
+        shard_id = self.shard_id or 0
+        return [{"shard_id": shard_id, "latency": self.latency, "guilds": len(self.guilds), "closed": self.is_closed()}]
+
+    async def warm_guild(self, guild: discord.Guild) -> None:
+        """解析配置中的角色/频道；启用预热时再把验证状态和语言偏好载入内存"""
+        get_resolver().warm(guild)
+        if not self.warmup or guild.id in self._warmed:
+            return
+        self._warmed.add(guild.id)
+        try:
+            if not await get_async_db().warm_guild(guild.id):
+                log.warning("AUTH_WARMUP needs the read cache (DB_CACHE_SIZE > 0); skipping")
+                self.warmup = False
+        except Exception:
+            self._warmed.discard(guild.id)
+            log.exception("Warm-up failed for guild %s", guild.id)
+
+    async def warm_up(self) -> None:
+        # 每个分片内逐个服务器预热，分片之间并行。同时进行的预热不超过数据库执行
+        # 线程数减一（至少一个）：多线程时始终留有空闲线程；单线程时预热按批提交，
+        # 交互请求最多排在一批之后
+        started = time.monotonic()
+        by_shard: Dict[int, List[discord.Guild]] = defaultdict(list)
+        for guild in list(self.guilds):
+            by_shard[guild.shard_id].append(guild)
+        slots = asyncio.Semaphore(max(1, get_async_db().max_workers - 1))
+
+        async def warm_shard(guilds: List[discord.Guild]) -> None:
+            for guild in guilds:
+                async with slots:
+                    await self.warm_guild(guild)
+
+        await asyncio.gather(*(warm_shard(guilds) for guilds in by_shard.values()))
+        log.info("Warm-up finished for %d guild(s) on %d shard(s) in %.2fs",
+                 len(self.guilds), len(by_shard), time.monotonic() - started)
+
+    async def on_shard_ready(self, shard_id: int) -> None:
+        count = sum(1 for guild in self.guilds if guild.shard_id == shard_id)
+        log.info("Shard %d ready with %d guild(s)", shard_id, count)
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        await self.warm_guild(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self._warmed.discard(guild.id)
+        get_async_db().drop_guild(guild.id)
+
+    async def close(self) -> None:
+        try:
+            await super().close()
+        finally:
+            if self.auth_api is not None:
+                await self.auth_api.aclose()
+
+
+class AuthBot(AuthBotMixin, commands.Bot):
+    """Single gateway connection; the default."""
+
+
+class ShardedAuthBot(AuthBotMixin, commands.AutoShardedBot):
+    """One process running several shards, or a slice of them (DISCORD_SHARD_IDS)."""
+
+
 def build_bot() -> commands.Bot:
     intents = discord.Intents.default()
     intents.members = True  # required to fetch members and assign roles
     intents.message_content = False  # enable if you need to read message contents
 
-    bot = commands.Bot(command_prefix=commands.when_mentioned_or("!"), intents=intents)
+    options: Dict[str, Any] = dict(
+        command_prefix=commands.when_mentioned_or("!"),
+        intents=intents,
+        auth_api=AuthAPI.from_env(),
+        warmup=os.getenv("AUTH_WARMUP", "false").strip().lower() in {"1", "true", "yes", "y", "on"},
+    )
+    shard_ids = _shard_ids_from_env("DISCORD_SHARD_IDS")
+    shard_count = _int_from_env("DISCORD_SHARD_COUNT")
+    auto_shard = os.getenv("DISCORD_AUTO_SHARD", "false").strip().lower() in {"1", "true", "yes", "y", "on"}
+    bot: commands.Bot
+    if shard_ids is not None:
+        if not shard_count:
+            raise RuntimeError("DISCORD_SHARD_IDS requires DISCORD_SHARD_COUNT")
+        log.info("Running shard(s) %s of %d", shard_ids, shard_count)
+        bot = ShardedAuthBot(shard_ids=shard_ids, shard_count=shard_count, **options)
+    elif auto_shard or shard_count:
+        log.info("Running all shards in this process (shard count: %s)", shard_count or "auto")
+        bot = ShardedAuthBot(shard_count=shard_count, **options)
+    else:
+        bot = AuthBot(**options)
+
+    config = get_config()
+    log.info("Auth role=%r channel=%r", config.role_name, config.channel_name)
+    for listener in get_resolver().listeners() + get_member_resolver().listeners():
+        bot.add_listener(listener)
 
     @bot.event
     async def on_ready():
         log.info("Logged in as %s (ID: %s)", bot.user, bot.user.id if bot.user else "?")
-        try:
-            guild_id = _int_from_env("GUILD_ID")
-            if guild_id:
-                # Sync commands to a single guild for faster updates during dev
-                guild = discord.Object(id=guild_id)
-                synced = await bot.tree.sync(guild=guild)
-                log.info("Synced %d commands to guild %s", len(synced), guild_id)
-            else:
-                synced = await bot.tree.sync()
-                log.info("Globally synced %d commands", len(synced))
-        except Exception:
-            log.exception("Failed to sync application commands")
+        if bot.owns_command_sync:
+            try:
+                guild_id = _int_from_env("GUILD_ID")
+                if guild_id:
+                    # Sync commands to a single guild for faster updates during dev
+                    guild = discord.Object(id=guild_id)
+                    synced = await bot.tree.sync(guild=guild)
+                    log.info("Synced %d commands to guild %s", len(synced), guild_id)
+                else:
+                    synced = await bot.tree.sync()
+                    log.info("Globally synced %d commands", len(synced))
+            except Exception:
+                log.exception("Failed to sync application commands")
+        await bot.warm_up()
 
     # Register slash command group
     register_commands(bot)
@@ -68,4 +220,80 @@ def run() -> None:
         raise RuntimeError("DISCORD_TOKEN is not set. Create a .env file or export the environment variable.")
 
     bot = build_bot()
-    bot.run(token)
+    try:
+        bot.run(token)
+    finally:
+        close_db()
+
+
+def cli(argv: Optional[List[str]] = None) -> int:
+    """离线维护工具：批量导入/导出验证记录、升级数据库结构（不启动机器人）"""
+    from .transfer import FORMATS, DEFAULT_CHUNK_SIZE, export_file, import_file
+
+    parser = argparse.ArgumentParser(prog="python -m authbot", description="AuthBot maintenance tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="import verified users from JSONL / CSV / legacy data.json")
+    p_import.add_argument("path")
+    p_import.add_argument("--format", choices=FORMATS, help="default: guessed from the file extension")
+    p_import.add_argument("--guild", type=int, help="import every record into this guild id")
+    p_import.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    p_export = sub.add_parser("export", help="export verified users to JSONL / CSV")
+    p_export.add_argument("path")
+    p_export.add_argument("--format", choices=("jsonl", "csv"), help="default: guessed from the file extension")
+    p_export.add_argument("--guild", type=int, help="only export this guild id")
+
+    sub.add_parser("migrate", help="upgrade the database schema to the latest version")
+
+    p_rebalance = sub.add_parser("rebalance", help="move rows to the shard DB_SHARDS assigns them to (run while the bot is stopped)")
+    p_rebalance.add_argument("--drain", action="append", default=[], metavar="URL",
+                             help="old shard no longer in DB_SHARDS; all of its rows are moved out (repeatable)")
+    p_rebalance.add_argument("--batch-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    p_rebalance.add_argument("--dry-run", action="store_true", help="only count the rows that would move")
+
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    logging.basicConfig(level=getattr(logging, level, logging.INFO), format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    if args.command == "rebalance":
+        return _rebalance(args)
+
+    try:
+        db = get_db()
+        if args.command == "import":
+            count = import_file(db, args.path, args.format, args.guild, args.chunk_size)
+            log.info("Imported %d record(s) from %s", count, args.path)
+        elif args.command == "export":
+            count = export_file(db, args.path, args.format, args.guild)
+            log.info("Exported %d record(s) to %s", count, args.path)
+        else:
+            # get_db() 初始化时已完成迁移
+            log.info("Database schema is at v%d", SCHEMA_VERSION)
+    finally:
+        close_db()
+    return 0
+
+
+def _rebalance(args: argparse.Namespace) -> int:
+    from .sharding import ShardedBackend, backend_from_url, rebalance, redact_url
+    from .storage import DB_SHARDS, DB_SHARD_VNODES
+
+    if not DB_SHARDS:
+        log.error("DB_SHARDS is not set; nothing to rebalance")
+        return 1
+    # 直接操作各分片，绕过读缓存和写后队列
+    router = ShardedBackend.from_urls(DB_SHARDS, vnodes=DB_SHARD_VNODES)
+    drained = {redact_url(url): backend_from_url(url) for url in args.drain}
+    try:
+        report = rebalance(router, drained, batch_size=args.batch_size, dry_run=args.dry_run)
+        log.info("%s %d verified row(s) and %d language row(s) across %d guild(s)",
+                 "Would move" if args.dry_run else "Moved",
+                 report.verified_moved, report.langs_moved, report.guilds_moved)
+    finally:
+        router.close()
+        for backend in drained.values():
+            backend.close()
+    return 0
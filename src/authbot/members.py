@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+from .cache import TTLCache
+
+log = logging.getLogger("authbot.members")
+
+Key = Tuple[int, int]
+
+
+def roles_after(member: discord.Member, add: Optional[discord.Role] = None,
+                remove: Optional[discord.Role] = None) -> Optional[List[discord.Role]]:
+    """计算成员改动后的完整角色列表，用于一次 member.edit(roles=...)；没有变化时返回 None
+
+    member 必须是最新状态（交互载荷或 gateway 缓存），否则会覆盖掉期间的角色变动。
+    """
+    roles = [r for r in member.roles if not r.is_default()]
+    changed = False
+    if remove is not None and remove in roles:
+        roles.remove(remove)
+        changed = True
+    if add is not None and add not in roles:
+        roles.append(add)
+        changed = True
+    return roles if changed else None
+
+
+class MemberResolver:
+    """解析发起交互的成员，尽量不走 REST
+
+    依次尝试：交互载荷自带的 Member、gateway 成员缓存、最近通过 API 取到的成员
+    （有界 LRU，过期时间较短以免角色信息陈旧），最后才调用 guild.fetch_member。
+    同一用户的并发请求合并为一次 API 调用。
+    """
+
+    def __init__(self, maxsize: int = 5000, ttl: float = 60.0) -> None:
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[Key, "asyncio.Future[discord.Member]"] = {}
+
+    def peek(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        member = guild.get_member(user_id)
+        if member is None and self._cache.maxsize > 0:
+            member = self._cache.get((guild.id, user_id), None)
+        return member
+
+    async def get(self, guild: discord.Guild, user_id: int) -> discord.Member:
+        member = self.peek(guild, user_id)
+        if member is not None:
+            return member
+        key = (guild.id, user_id)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(guild.fetch_member(user_id))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            log.debug("Joined in-flight fetch_member for %s/%s", guild.id, user_id)
+        # shield：某个等待者被取消时不影响其他合并进来的请求
+        member = await asyncio.shield(future)
+        if self._cache.maxsize > 0:
+            self._cache.set(key, member)
+        return member
+
+    def forget(self, guild_id: int, user_id: int) -> None:
+        self._cache.pop((guild_id, user_id))
+
+    # ---------- gateway 事件 ----------
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        if self._cache.get((after.guild.id, after.id), None, count_miss=False) is not None:
+            self._cache.set((after.guild.id, after.id), after)
+
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.forget(member.guild.id, member.id)
+
+    def listeners(self):
+        return (self.on_member_update, self.on_member_remove)
+
+
+_resolver: Optional[MemberResolver] = None
+
+
+def get_member_resolver() -> MemberResolver:
+    global _resolver
+    if _resolver is None:
+        from .config import get_config
+        config = get_config()
+        _resolver = MemberResolver(config.member_cache_size, config.member_cache_ttl)
+    return _resolver
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import discord
+
+from .batch import Job
+
+log = logging.getLogger("authbot.overwrites")
+
+GuildChannel = Union[discord.CategoryChannel, discord.TextChannel]
+Target = Union[discord.Role, discord.Member]
+
+_AUTH_CHANNEL_PERMS = {"view_channel": True, "send_messages": True}
+
+
+@dataclass
+class OverwriteChange:
+    """一条需要写入的覆盖权限：只包含与当前值不同的部分，其余权限保持原样"""
+
+    channel: GuildChannel
+    target: Optional[Target]
+    target_name: str
+    before: discord.PermissionOverwrite
+    after: discord.PermissionOverwrite
+
+    def diff(self) -> Dict[str, Tuple[Optional[bool], Optional[bool]]]:
+        old = dict(self.before)
+        return {name: (old[name], value) for name, value in self.after if old[name] != value}
+
+    def describe(self) -> str:
+        changes = ", ".join(f"{name}: {a}→{b}" for name, (a, b) in self.diff().items())
+        return f"#{self.channel.name} @{self.target_name}: {changes}"
+
+    def job(self) -> Job:
+        if self.target is None:
+            raise ValueError(f"cannot apply overwrite for missing target {self.target_name}")
+        channel, target, after = self.channel, self.target, self.after
+        label = f"channel={channel.id} target={target.id}"
+        return label, lambda: channel.set_permissions(target, overwrite=after, reason="Auth setup")
+
+
+def _plan_one(channel: GuildChannel, target: Optional[Target], target_name: str, perms: Dict[str, bool]) -> Optional[OverwriteChange]:
+    if target is None:
+        before = discord.PermissionOverwrite()
+    else:
+        before = channel.overwrites_for(target)
+    after = discord.PermissionOverwrite.from_pair(*before.pair())
+    after.update(**perms)
+    if after == before:
+        return None
+    return OverwriteChange(channel, target, target_name, before, after)
+
+
+def plan_overwrites(
+    guild: discord.Guild,
+    success_role: Optional[discord.Role],
+    auth_channel: Optional[discord.TextChannel],
+    hide_others: bool,
+    role_name: str = "",
+) -> List[OverwriteChange]:
+    """根据缓存中的 channel.overwrites 计算 setup 需要的最小改动集
+
+    ``success_role`` / ``auth_channel`` 为 None 表示尚未创建（dry-run 时），
+    此时对应目标的所有期望权限都视为待写入。
+    """
+    everyone = guild.default_role
+    role_label = success_role.name if success_role else role_name
+
+    def wanted() -> Iterator[Tuple[GuildChannel, Optional[Target], str, Dict[str, bool]]]:
+        if auth_channel is not None:
+            yield auth_channel, everyone, everyone.name, _AUTH_CHANNEL_PERMS
+            yield auth_channel, success_role, role_label, _AUTH_CHANNEL_PERMS
+            yield auth_channel, guild.me, guild.me.name, _AUTH_CHANNEL_PERMS
+        if not hide_others:
+            return
+        for category in guild.categories:
+            yield category, everyone, everyone.name, {"view_channel": False}
+            yield category, success_role, role_label, {"view_channel": True}
+        for ch in guild.text_channels:
+            if auth_channel is not None and ch.id == auth_channel.id:
+                continue
+            yield ch, everyone, everyone.name, {"view_channel": False}
+            yield ch, success_role, role_label, {"view_channel": True, "send_messages": True}
+
+    plan: List[OverwriteChange] = []
+    checked = 0
+    for channel, target, name, perms in wanted():
+        checked += 1
+        change = _plan_one(channel, target, name, perms)
+        if change is not None:
+            plan.append(change)
+    log.info("Overwrite plan for guild %s: %d change(s), %d already correct", guild.id, len(plan), checked - len(plan))
+    return plan
+
+
+def format_plan(plan: List[OverwriteChange], limit: int = 1800) -> str:
+    """把计划渲染为适合放进一条消息的文本，超出长度时截断"""
+    lines: List[str] = []
+    used = 0
+    for i, change in enumerate(plan):
+        line = change.describe()
+        if used + len(line) + 1 > limit:
+            lines.append(f"… (+{len(plan) - i})")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(lines)
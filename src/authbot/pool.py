@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Iterator, Optional, Tuple
+
+log = logging.getLogger("authbot.pool")
+
+
+class PoolTimeout(Exception):
+    """在超时时间内没有可用连接"""
+
+
+class ConnectionPool:
+    """线程安全的有界数据库连接池
+
+    - 最多同时打开 ``max_size`` 个连接，超出时等待 ``timeout`` 秒
+    - 空闲超过 ``ping_after`` 秒的连接在借出前做一次健康检查
+    - 空闲超过 ``max_idle`` 秒且数量多于 ``min_size`` 的连接会被回收
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        *,
+        min_size: int = 1,
+        max_size: int = 5,
+        max_idle: float = 300.0,
+        timeout: float = 10.0,
+        ping: Optional[Callable[[Any], bool]] = None,
+        ping_after: float = 5.0,
+        name: str = "db",
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self._factory = factory
+        self._ping = ping
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.name = name
+        # (conn, last_used)，右端为最近归还的连接
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def warm(self) -> None:
+        """预先打开 min_size 个连接"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            self.release(conn)
+
+    def acquire(self) -> Any:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = None
+            last_used = 0.0
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError(f"connection pool '{self.name}' is closed")
+                    if self._idle:
+                        # LIFO：优先复用最热的连接
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"no connection available in pool '{self.name}' after {self.timeout}s")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self._factory()
+                except Exception:
+                    self._discard_slot()
+                    raise
+
+            if self._healthy(conn, last_used):
+                return conn
+            log.debug("Pool %s: dropping stale connection", self.name)
+            self._close_conn(conn)
+            self._discard_slot()
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        if discard:
+            self._close_conn(conn)
+            self._discard_slot()
+            return
+        to_close = []
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                to_close.append(conn)
+            else:
+                now = time.monotonic()
+                self._idle.append((conn, now))
+                to_close.extend(self._reap_locked(now))
+            self._cond.notify()
+        for c in to_close:
+            self._close_conn(c)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                self.release(conn, discard=True)
+            else:
+                self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_conn(conn)
+
+    # ---------- 内部方法 ----------
+
+    def _healthy(self, conn: Any, last_used: float) -> bool:
+        idle_for = time.monotonic() - last_used
+        if idle_for > self.max_idle:
+            return False
+        if self._ping is not None and idle_for > self.ping_after:
+            try:
+                return bool(self._ping(conn))
+            except Exception:
+                return False
+        return True
+
+    def _reap_locked(self, now: float) -> list:
+        """回收最久未用且超过 max_idle 的连接（保留 min_size 个）"""
+        reaped = []
+        while len(self._idle) > 0 and self._size > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used <= self.max_idle:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            reaped.append(conn)
+        return reaped
+
+    def _discard_slot(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_conn(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
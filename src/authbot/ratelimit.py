@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+import time
+import logging
+from typing import Dict, Hashable, Optional, Tuple
+
+log = logging.getLogger("authbot.ratelimit")
+
+
+class TokenBucketLimiter:
+    """按 key 计算的令牌桶
+
+    每个桶只存 ``(tokens, updated_at)`` 两个浮点数。空闲到令牌已回满的桶与
+    新建桶等价，定期清扫时直接丢弃，因此内存只与近期活跃的 key 数量相关。
+    """
+
+    def __init__(self, rate: float, burst: float, sweep_interval: float = 60.0) -> None:
+        if rate <= 0 or burst <= 0:
+            raise ValueError("rate and burst must be positive")
+        self.rate = rate
+        self.burst = float(burst)
+        self.sweep_interval = sweep_interval
+        self._buckets: Dict[Hashable, Tuple[float, float]] = {}
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.burst
+        tokens, updated = bucket
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def retry_after(self, key: Hashable, cost: float = 1.0) -> float:
+        """返回还需等待的秒数（0 表示现在就可以），不消耗令牌"""
+        now = time.monotonic()
+        tokens = self._tokens(key, now)
+        if tokens >= cost:
+            return 0.0
+        return (cost - tokens) / self.rate
+
+    def consume(self, key: Hashable, cost: float = 1.0) -> None:
+        now = time.monotonic()
+        self._buckets[key] = (self._tokens(key, now) - cost, now)
+        if now - self._last_sweep >= self.sweep_interval:
+            self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        full_after = self.burst / self.rate
+        idle = [k for k, (_, updated) in self._buckets.items() if now - updated >= full_after]
+        for key in idle:
+            del self._buckets[key]
+        self._last_sweep = now
+        if idle:
+            log.debug("Evicted %d idle rate-limit buckets, %d remain", len(idle), len(self._buckets))
+
+
+class LoginRateLimiter:
+    """登录尝试限流：同时受 (guild, user) 与 guild 两级令牌桶约束"""
+
+    def __init__(self, user_rate: float, user_burst: float, guild_rate: float, guild_burst: float) -> None:
+        self.users = TokenBucketLimiter(user_rate, user_burst)
+        self.guilds = TokenBucketLimiter(guild_rate, guild_burst)
+
+    def retry_after(self, guild_id: int, user_id: int) -> float:
+        return max(self.users.retry_after((guild_id, user_id)), self.guilds.retry_after(guild_id))
+
+    def hit(self, guild_id: int, user_id: int) -> float:
+        """尝试消耗一次登录额度；被限流时返回需等待的秒数，否则返回 0"""
+        wait = self.retry_after(guild_id, user_id)
+        if wait > 0:
+            log.info("Login rate limited: guild=%s user=%s retry_after=%.1fs", guild_id, user_id, wait)
+            return wait
+        self.users.consume((guild_id, user_id))
+        self.guilds.consume(guild_id)
+        return 0.0
+
+
+_login_limiter: Optional[LoginRateLimiter] = None
+
+
+def get_login_limiter() -> LoginRateLimiter:
+    global _login_limiter
+    if _login_limiter is None:
+        # 配置单位为“每分钟次数”
+        _login_limiter = LoginRateLimiter(
+            user_rate=float(os.getenv("AUTH_RATE_USER_PER_MIN", "5")) / 60.0,
+            user_burst=float(os.getenv("AUTH_RATE_USER_BURST", "3")),
+            guild_rate=float(os.getenv("AUTH_RATE_GUILD_PER_MIN", "120")) / 60.0,
+            guild_burst=float(os.getenv("AUTH_RATE_GUILD_BURST", "30")),
+        )
+    return _login_limiter
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import time
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterator, List, Optional
+
+import discord
+
+from .batch import BatchExecutor, Job
+from .members import roles_after
+from .storage import AsyncDatabaseBackend, VerifiedRecord
+
+log = logging.getLogger("authbot.reconcile")
+
+
+@dataclass
+class ReconcileReport:
+    """一次对账的结果；dry_run 时各计数表示“将会”执行的操作"""
+
+    dry_run: bool = False
+    backfill: bool = False
+    checked: int = 0
+    add_role: int = 0
+    remove_role: int = 0
+    backfilled: int = 0
+    missing_members: int = 0
+    failed: int = 0
+
+
+ReconcileProgress = Callable[[ReconcileReport], Awaitable[None]]
+
+
+class RoleReconciler:
+    """对齐数据库中的验证记录与服务器里的验证角色
+
+    以数据库为准：有记录但缺少角色的成员补发角色；持有角色但没有记录的成员
+    默认移除角色，``backfill=True`` 时改为把他们写入数据库。配置了未验证角色时，
+    与登录和撤销一样在同一次 member.edit 中互换两个角色。
+
+    持有角色的成员 ID 排序后，与按 user_id 有序分批读出的数据库记录做归并，
+    每批只生成这一批的 Discord 请求并交给 BatchExecutor，内存占用取决于批大小
+    和角色持有人数，而不是服务器总人数。已不在服务器内的记录只计数，不做修改。
+    大服务器可能运行很久，``progress`` 每隔 ``progress_interval`` 秒收到一次当前报告。
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabaseBackend,
+        concurrency: int = 5,
+        batch_size: int = 1000,
+        progress: Optional[ReconcileProgress] = None,
+        progress_interval: float = 3.0,
+    ) -> None:
+        self.db = db
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self._last_report = 0.0
+
+    async def run(
+        self,
+        guild: discord.Guild,
+        role: discord.Role,
+        dry_run: bool = False,
+        backfill: bool = False,
+        unverified: Optional[discord.Role] = None,
+    ) -> ReconcileReport:
+        report = ReconcileReport(dry_run=dry_run, backfill=backfill)
+        self._last_report = time.monotonic()
+        if not guild.chunked:
+            await guild.chunk(cache=True)
+
+        holders: Iterator[int] = iter(sorted(m.id for m in role.members))
+        holder: Optional[int] = next(holders, None)
+
+        async for rows in self.db.iter_verified(guild.id, self.batch_size):
+            jobs: List[Job] = []
+            extra: List[discord.Member] = []
+            for row in rows:
+                user_id = int(row["user_id"])
+                report.checked += 1
+                # 排在当前记录之前的角色持有人在数据库里没有记录
+                while holder is not None and holder < user_id:
+                    self._collect_extra(guild, holder, report, extra)
+                    holder = next(holders, None)
+                if holder == user_id:
+                    holder = next(holders, None)
+                    continue
+                member = guild.get_member(user_id)
+                if member is None:
+                    report.missing_members += 1
+                    continue
+                report.add_role += 1
+                jobs.append(self._add_job(member, role, unverified))
+            await self._flush(guild, role, unverified, report, jobs, extra)
+
+        extra = []
+        while holder is not None:
+            self._collect_extra(guild, holder, report, extra)
+            holder = next(holders, None)
+            if len(extra) >= self.batch_size:
+                await self._flush(guild, role, unverified, report, [], extra)
+                extra = []
+        await self._flush(guild, role, unverified, report, [], extra)
+
+        log.info(
+            "Reconciled guild %s: checked=%d add=%d remove=%d backfill=%d missing=%d failed=%d dry_run=%s",
+            guild.id, report.checked, report.add_role, report.remove_role, report.backfilled,
+            report.missing_members, report.failed, dry_run,
+        )
+        return report
+
+    def _collect_extra(self, guild: discord.Guild, user_id: int, report: ReconcileReport,
+                       extra: List[discord.Member]) -> None:
+        member = guild.get_member(user_id)
+        if member is None:
+            return
+        if report.backfill:
+            report.backfilled += 1
+        else:
+            report.remove_role += 1
+        extra.append(member)
+
+    async def _report(self, report: ReconcileReport) -> None:
+        now = time.monotonic()
+        if self.progress is None or now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        try:
+            await self.progress(report)
+        except Exception as e:
+            log.debug("Reconcile progress callback failed: %s", e)
+
+    async def _flush(self, guild: discord.Guild, role: discord.Role, unverified: Optional[discord.Role],
+                     report: ReconcileReport, jobs: List[Job], extra: List[discord.Member]) -> None:
+        if report.dry_run:
+            await self._report(report)
+            return
+        if report.backfill:
+            if extra:
+                records: List[VerifiedRecord] = [
+                    (guild.id, m.id, m.name) for m in extra
+                ]
+                await self.db.mark_verified_many(records)
+        else:
+            jobs.extend(self._remove_job(m, role, unverified) for m in extra)
+        if jobs:
+            executor = BatchExecutor(
+                concurrency=self.concurrency,
+                progress=lambda _: self._report(report),
+                progress_interval=self.progress_interval,
+            )
+            result = await executor.run(jobs)
+            report.failed += result.failed
+        await self._report(report)
+
+    @staticmethod
+    def _add_job(member: discord.Member, role: discord.Role, unverified: Optional[discord.Role]) -> Job:
+        return (f"add {role.id} to {member.id}",
+                lambda: _swap_roles(member, role, unverified, "Reconcile: verified in database"))
+
+    @staticmethod
+    def _remove_job(member: discord.Member, role: discord.Role, unverified: Optional[discord.Role]) -> Job:
+        return (f"remove {role.id} from {member.id}",
+                lambda: _swap_roles(member, unverified, role, "Reconcile: not verified in database"))
+
+
+async def _swap_roles(member: discord.Member, add: Optional[discord.Role], remove: Optional[discord.Role],
+                      reason: str) -> None:
+    # 执行时再从 gateway 缓存取成员，角色列表以此刻为准，不会覆盖排队期间的变动
+    current = member.guild.get_member(member.id)
+    if current is None:
+        return
+    roles = roles_after(current, add=add, remove=remove)
+    if roles is not None:
+        await current.edit(roles=roles, reason=reason)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import discord
+
+log = logging.getLogger("authbot.resolver")
+
+Key = Tuple[int, str]
+
+
+class GuildResolver:
+    """按服务器缓存 名称 → 角色/频道 ID
+
+    命中后通过 guild.get_role / guild.get_channel 直接取对象，不再线性扫描
+    guild.roles / guild.text_channels。角色/频道的创建、改名、删除事件会同步
+    维护缓存，因此“不存在”的结果也会被缓存（值为 None）；缓存的 ID 失效时
+    回退到一次扫描。
+    """
+
+    def __init__(self, role_names: Iterable[str] = (), channel_names: Iterable[str] = ()) -> None:
+        self._roles: Dict[Key, Optional[int]] = {}
+        self._channels: Dict[Key, Optional[int]] = {}
+        self._role_names: Set[str] = set(role_names)
+        self._channel_names: Set[str] = set(channel_names)
+
+    def warm(self, guild: discord.Guild) -> None:
+        """一次性解析所有关注的角色/频道名称"""
+        for name in self._role_names:
+            self._roles[(guild.id, name)] = _id(discord.utils.get(guild.roles, name=name))
+        for name in self._channel_names:
+            self._channels[(guild.id, name)] = _id(discord.utils.get(guild.text_channels, name=name))
+
+    def role(self, guild: discord.Guild, name: str) -> Optional[discord.Role]:
+        key = (guild.id, name)
+        if key in self._roles:
+            role_id = self._roles[key]
+            if role_id is None:
+                return None
+            role = guild.get_role(role_id)
+            if role is not None:
+                return role
+        self._role_names.add(name)
+        role = discord.utils.get(guild.roles, name=name)
+        self._roles[key] = _id(role)
+        return role
+
+    def text_channel(self, guild: discord.Guild, name: str) -> Optional[discord.TextChannel]:
+        key = (guild.id, name)
+        if key in self._channels:
+            channel_id = self._channels[key]
+            if channel_id is None:
+                return None
+            channel = guild.get_channel(channel_id)
+            if isinstance(channel, discord.TextChannel):
+                return channel
+        self._channel_names.add(name)
+        channel = discord.utils.get(guild.text_channels, name=name)
+        self._channels[key] = _id(channel)
+        return channel
+
+    def remember_role(self, role: discord.Role) -> None:
+        self._roles[(role.guild.id, role.name)] = role.id
+
+    def remember_channel(self, channel: discord.TextChannel) -> None:
+        self._channels[(channel.guild.id, channel.name)] = channel.id
+
+    def forget_guild(self, guild_id: int) -> None:
+        for cache in (self._roles, self._channels):
+            for key in [k for k in cache if k[0] == guild_id]:
+                del cache[key]
+
+    # ---------- gateway 事件 ----------
+
+    def _drop(self, cache: Dict[Key, Optional[int]], guild: discord.Guild, name: str, obj_id: int,
+              lookup) -> None:
+        """某个同名对象消失时，回退到同名的其他对象（如果有）"""
+        key = (guild.id, name)
+        if key in cache and cache[key] == obj_id:
+            cache[key] = _id(lookup(name))
+
+    def _add(self, cache: Dict[Key, Optional[int]], names: Set[str], guild: discord.Guild, name: str,
+             obj_id: int) -> None:
+        key = (guild.id, name)
+        # 已缓存同名对象时保持不变，与 discord.utils.get 返回第一个匹配的行为一致
+        if name in names and cache.get(key) is None:
+            cache[key] = obj_id
+
+    def _role_lookup(self, guild: discord.Guild, exclude: int):
+        return lambda name: discord.utils.find(lambda r: r.name == name and r.id != exclude, guild.roles)
+
+    def _channel_lookup(self, guild: discord.Guild, exclude: int):
+        return lambda name: discord.utils.find(lambda c: c.name == name and c.id != exclude, guild.text_channels)
+
+    async def on_guild_role_create(self, role: discord.Role) -> None:
+        self._add(self._roles, self._role_names, role.guild, role.name, role.id)
+
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        self._drop(self._roles, role.guild, role.name, role.id, self._role_lookup(role.guild, role.id))
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        if before.name == after.name:
+            return
+        self._drop(self._roles, before.guild, before.name, before.id, self._role_lookup(before.guild, before.id))
+        self._add(self._roles, self._role_names, after.guild, after.name, after.id)
+        log.debug("Role %s renamed: %r -> %r", after.id, before.name, after.name)
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        if isinstance(channel, discord.TextChannel):
+            self._add(self._channels, self._channel_names, channel.guild, channel.name, channel.id)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        self._drop(self._channels, channel.guild, channel.name, channel.id,
+                   self._channel_lookup(channel.guild, channel.id))
+
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel) -> None:
+        if before.name == after.name:
+            return
+        self._drop(self._channels, before.guild, before.name, before.id,
+                   self._channel_lookup(before.guild, before.id))
+        if isinstance(after, discord.TextChannel):
+            self._add(self._channels, self._channel_names, after.guild, after.name, after.id)
+        log.debug("Channel %s renamed: %r -> %r", after.id, before.name, after.name)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.forget_guild(guild.id)
+
+    def listeners(self):
+        return (
+            self.on_guild_role_create,
+            self.on_guild_role_delete,
+            self.on_guild_role_update,
+            self.on_guild_channel_create,
+            self.on_guild_channel_delete,
+            self.on_guild_channel_update,
+            self.on_guild_remove,
+        )
+
+
+def _id(obj) -> Optional[int]:
+    return obj.id if obj is not None else None
+
+
+_resolver: Optional[GuildResolver] = None
+
+
+def get_resolver() -> GuildResolver:
+    global _resolver
+    if _resolver is None:
+        from .config import get_config
+        config = get_config()
+        role_names = [config.role_name]
+        if config.unverified_role_name:
+            role_names.append(config.unverified_role_name)
+        _resolver = GuildResolver(role_names, [config.channel_name])
+    return _resolver
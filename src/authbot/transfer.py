@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import io
+import csv
+import json
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from .storage import AsyncDatabaseBackend, DatabaseBackend, TimedVerifiedRecord
+
+log = logging.getLogger("authbot.transfer")
+
+FORMATS = ("jsonl", "csv", "legacy")
+CSV_FIELDS = ["guild_id", "user_id", "username", "verified_at"]
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def detect_format(path: str) -> str:
+    """按扩展名推断格式：.jsonl / .csv / .json（旧版 AUTH_DATA_FILE）"""
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        return "csv"
+    if lower.endswith(".json"):
+        return "legacy"
+    return "jsonl"
+
+
+def _record(row: Any, guild_id: Optional[int]) -> Optional[TimedVerifiedRecord]:
+    try:
+        gid = guild_id if guild_id is not None else int(row["guild_id"])
+        # 没有 verified_at（旧版文件、CSV 空单元格）时由数据库取当前时间
+        verified_at = row.get("verified_at") or None
+        return (gid, int(row["user_id"]), str(row.get("username") or "user"),
+                None if verified_at is None else str(verified_at))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _jsonl_rows(fh: TextIO) -> Iterator[Any]:
+    """逐行解析 JSONL，无法解析的行产出 None，由调用方计入跳过数"""
+    for line in fh:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def read_records(fh: TextIO, fmt: str, guild_id: Optional[int] = None) -> Iterator[TimedVerifiedRecord]:
+    """逐条解析导入文件；guild_id 不为 None 时忽略文件中的 guild_id 并统一写入该服务器"""
+    if fmt == "jsonl":
+        rows: Iterable[Any] = _jsonl_rows(fh)
+    elif fmt == "csv":
+        rows = csv.DictReader(fh)
+    elif fmt == "legacy":
+        rows = _legacy_rows(json.load(fh))
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+    skipped = 0
+    for row in rows:
+        record = _record(row, guild_id)
+        if record is None:
+            skipped += 1
+            continue
+        yield record
+    if skipped:
+        log.warning("Skipped %d malformed record(s)", skipped)
+
+
+def _legacy_rows(data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """展开旧版 data.json：{"guilds": {gid: {"verified": {uid: {"username": ...}}}}}"""
+    guilds = data.get("guilds", data)
+    for gid, guild_data in guilds.items():
+        if not isinstance(guild_data, dict):
+            continue
+        verified = guild_data.get("verified", guild_data)
+        for uid, info in verified.items():
+            if not isinstance(info, dict):
+                continue
+            yield {"guild_id": gid, "user_id": uid, "username": info.get("username")}
+
+
+def _chunks(records: Iterable[TimedVerifiedRecord], size: int) -> Iterator[List[TimedVerifiedRecord]]:
+    chunk: List[TimedVerifiedRecord] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_records(db: DatabaseBackend, records: Iterable[TimedVerifiedRecord],
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """按块写入，每块一个事务；保留文件中的 verified_at"""
+    total = 0
+    for chunk in _chunks(records, chunk_size):
+        total += db.restore_verified_many(chunk)
+        log.info("Imported %d record(s)", total)
+    return total
+
+
+def _row_writer(fh: TextIO, fmt: str) -> Callable[[Dict[str, Any]], None]:
+    """返回把一条记录写成 JSONL 或 CSV 的函数；CSV 会先写表头"""
+    if fmt == "csv":
+        writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+    elif fmt != "jsonl":
+        raise ValueError(f"cannot export to format: {fmt}")
+
+    def write(row: Dict[str, Any]) -> None:
+        # ID 以字符串输出以免丢失精度
+        out = {
+            "guild_id": str(row["guild_id"]),
+            "user_id": str(row["user_id"]),
+            "username": row["username"],
+            "verified_at": None if row.get("verified_at") is None else str(row["verified_at"]),
+        }
+        if fmt == "csv":
+            writer.writerow(out)
+        else:
+            fh.write(json.dumps(out, ensure_ascii=False) + "\n")
+
+    return write
+
+
+def write_records(rows: Iterable[Dict[str, Any]], fh: TextIO, fmt: str) -> int:
+    """把记录流写成 JSONL 或 CSV"""
+    write = _row_writer(fh, fmt)
+    count = 0
+    for row in rows:
+        write(row)
+        count += 1
+    return count
+
+
+def import_file(db: DatabaseBackend, path: str, fmt: Optional[str] = None, guild_id: Optional[int] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    fmt = fmt or detect_format(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as fh:
+        return import_records(db, read_records(fh, fmt, guild_id), chunk_size)
+
+
+def export_file(db: DatabaseBackend, path: str, fmt: Optional[str] = None, guild_id: Optional[int] = None) -> int:
+    fmt = fmt or detect_format(path)
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        return write_records(db.iter_verified(guild_id), fh, fmt)
+
+
+async def import_bytes(db: AsyncDatabaseBackend, data: bytes, fmt: str, guild_id: int,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """导入上传的附件内容（供 /auth import 使用，记录强制归属当前服务器）
+
+    解析在普通线程中进行，每块写入单独提交到数据库执行线程，与其他存储访问共用同一执行器。
+    """
+    fh = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+    chunks = _chunks(read_records(fh, fmt, guild_id), chunk_size)
+    total = 0
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+        total += await db.restore_verified_many(chunk)
+        log.info("Imported %d record(s)", total)
+    return total
+
+
+async def export_guild(db: AsyncDatabaseBackend, path: str, fmt: str, guild_id: int) -> int:
+    """把一个服务器的验证记录按批读出并写入文件（供 /auth export 使用）"""
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        write = _row_writer(fh, fmt)
+        count = 0
+        async for rows in db.iter_verified(guild_id):
+            for row in rows:
+                write(row)
+            count += len(rows)
+    return count
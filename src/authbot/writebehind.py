@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from .storage import DatabaseBackend, LangRecord, TimedVerifiedRecord, VerifiedPage, VerifiedRecord
+
+log = logging.getLogger("authbot.writebehind")
+
+Key = Tuple[int, int]
+
+# DB-API 中只与具体某一行有关的错误（sqlite3 与 pymysql 同名），重试也不会成功
+ROW_ERRORS = ("IntegrityError", "DataError")
+
+
+def _is_row_error(exc: Exception) -> bool:
+    if isinstance(exc, (TypeError, ValueError)):
+        return True
+    return any(cls.__name__ in ROW_ERRORS for cls in type(exc).__mro__)
+
+
+class WriteBehindBackend(DatabaseBackend):
+    """把 mark_verified / set_lang 先写入内存队列，再由后台线程批量落库
+
+    - 同一 (guild_id, user_id) 的多次写入只保留最后一次
+    - 每 ``interval`` 秒或积压达到 ``max_batch`` 条时，以一个事务批量提交
+    - 批量提交因个别坏行失败时逐条重试并丢弃坏行；数据库不可用时整批留在队列中
+    - 读取时优先返回尚未落库（包括正在提交）的值，保证写后立即可读；刷写失败不影响读取
+    - close() 会停止后台线程并同步刷写剩余数据
+    """
+
+    def __init__(self, backend: DatabaseBackend, interval: float = 0.2, max_batch: int = 500) -> None:
+        self.backend = backend
+        self.interval = interval
+        self.max_batch = max(1, max_batch)
+        self._verified: Dict[Key, str] = {}
+        self._langs: Dict[Key, str] = {}
+        # 正在提交的批次，提交完成前读取仍以它为准
+        self._flushing_verified: Dict[Key, str] = {}
+        self._flushing_langs: Dict[Key, str] = {}
+        self._lock = threading.Lock()
+        # 串行化刷写与删除，避免旧批次在 revoke 之后才落库
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="authbot-write-behind", daemon=True)
+        self._thread.start()
+
+    @property
+    def executor_workers(self) -> int:
+        return self.backend.executor_workers
+
+    @property
+    def pending(self) -> int:
+        return len(self._verified) + len(self._langs)
+
+    # ---------- 刷写 ----------
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Write-behind flush failed; will retry")
+
+    def _enqueued(self) -> None:
+        if self.pending >= self.max_batch:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """把当前积压的写入批量提交，返回提交条数
+
+        整批失败且错误只与个别行有关（约束、数据错误）时逐条重试，坏行记录日志后
+        丢弃；连接断开等数据库错误则把未提交的行放回队列并抛出异常，稍后重试。
+        """
+        with self._flush_lock:
+            with self._lock:
+                verified, langs = self._verified, self._langs
+                # 提交完成前读取仍能看到这一批，先登记再清空队列
+                self._flushing_verified, self._flushing_langs = verified, langs
+                self._verified, self._langs = {}, {}
+            if not verified and not langs:
+                return 0
+            requeue_verified: Dict[Key, str] = {}
+            requeue_langs: Dict[Key, str] = {}
+            try:
+                written, error = self._commit(
+                    verified, self.backend.mark_verified_many, self.backend.mark_verified,
+                    "verification", requeue_verified,
+                )
+                if error is not None:
+                    requeue_langs.update(langs)
+                else:
+                    n, error = self._commit(
+                        langs, self.backend.set_lang_many, self.backend.set_lang,
+                        "lang pref", requeue_langs,
+                    )
+                    written += n
+            finally:
+                with self._lock:
+                    # 放回队列，较新的写入优先
+                    for key, name in requeue_verified.items():
+                        self._verified.setdefault(key, name)
+                    for key, lang in requeue_langs.items():
+                        self._langs.setdefault(key, lang)
+                    self._flushing_verified, self._flushing_langs = {}, {}
+            if error is not None:
+                raise error
+            log.debug("Write-behind flushed %d of %d write(s)", written, len(verified) + len(langs))
+            return written
+
+    @staticmethod
+    def _commit(rows: Dict[Key, str], bulk: Callable[[Iterable[Tuple[int, int, str]]], int],
+                single: Callable[[int, int, str], None], kind: str,
+                requeue: Dict[Key, str]) -> Tuple[int, Optional[Exception]]:
+        """提交一类写入，返回 (提交条数, 数据库错误)；需要重试的行放入 requeue"""
+        if not rows:
+            return 0, None
+        try:
+            bulk((g, u, value) for (g, u), value in rows.items())
+            return len(rows), None
+        except Exception as exc:
+            if not _is_row_error(exc):
+                requeue.update(rows)
+                return 0, exc
+            log.warning("Write-behind %s batch failed; retrying %d row(s) one by one",
+                        kind, len(rows), exc_info=True)
+        written = 0
+        error: Optional[Exception] = None
+        for (guild_id, user_id), value in rows.items():
+            if error is not None:
+                requeue[(guild_id, user_id)] = value
+                continue
+            try:
+                single(guild_id, user_id, value)
+                written += 1
+            except Exception as exc:
+                if _is_row_error(exc):
+                    log.error("Dropping write-behind %s %s (%s): %r", kind, (guild_id, user_id), value, exc)
+                else:
+                    error = exc
+                    requeue[(guild_id, user_id)] = value
+        return written, error
+
+    def _flush_for_read(self) -> None:
+        # 读取只需尽量看到积压的写入；刷写失败时数据仍在队列中，由后台线程重试
+        try:
+            self.flush()
+        except Exception:
+            log.exception("Write-behind flush before read failed; serving committed data")
+
+    # ---------- DatabaseBackend ----------
+
+    def init_tables(self) -> None:
+        self.backend.init_tables()
+
+    def _pending_username(self, key: Key) -> Optional[str]:
+        username = self._verified.get(key)
+        if username is None:
+            username = self._flushing_verified.get(key)
+        return username
+
+    def is_verified(self, guild_id: int, user_id: int) -> bool:
+        if self._pending_username((guild_id, user_id)) is not None:
+            return True
+        return self.backend.is_verified(guild_id, user_id)
+
+    def mark_verified(self, guild_id: int, user_id: int, username: str) -> None:
+        with self._lock:
+            self._verified[(guild_id, user_id)] = username
+        self._enqueued()
+
+    def revoke_verified(self, guild_id: int, user_id: int) -> bool:
+        with self._flush_lock:
+            with self._lock:
+                was_pending = self._verified.pop((guild_id, user_id), None) is not None
+            removed = self.backend.revoke_verified(guild_id, user_id)
+        return removed or was_pending
+
+    def get_user_info(self, guild_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+        username = self._pending_username((guild_id, user_id))
+        if username is not None:
+            return {"username": username, "verified_at": None}
+        return self.backend.get_user_info(guild_id, user_id)
+
+    def get_verified_users(self, guild_id: int) -> Dict[str, Dict[str, Any]]:
+        self._flush_for_read()
+        return self.backend.get_verified_users(guild_id)
+
+    def get_verified_page(self, guild_id: int, after: Optional[int] = None, limit: int = 25) -> VerifiedPage:
+        self._flush_for_read()
+        return self.backend.get_verified_page(guild_id, after, limit)
+
+    def count_verified(self, guild_id: int) -> int:
+        self._flush_for_read()
+        return self.backend.count_verified(guild_id)
+
+    def mark_verified_many(self, records: Iterable[VerifiedRecord]) -> int:
+        self.flush()
+        return self.backend.mark_verified_many(records)
+
+    def restore_verified_many(self, records: Iterable[TimedVerifiedRecord]) -> int:
+        self.flush()
+        return self.backend.restore_verified_many(records)
+
+    def revoke_verified_many(self, keys: Iterable[Tuple[int, int]]) -> int:
+        keys = list(keys)
+        with self._flush_lock:
+            with self._lock:
+                for key in keys:
+                    self._verified.pop(key, None)
+            return self.backend.revoke_verified_many(keys)
+
+    def iter_verified(self, guild_id: Optional[int] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        self._flush_for_read()
+        return self.backend.iter_verified(guild_id, batch_size)
+
+    def set_lang(self, guild_id: int, user_id: int, lang: str) -> None:
+        with self._lock:
+            self._langs[(guild_id, user_id)] = lang
+        self._enqueued()
+
+    def set_lang_many(self, records: Iterable[LangRecord]) -> int:
+        self.flush()
+        return self.backend.set_lang_many(records)
+
+    def iter_langs(self, guild_id: Optional[int] = None, batch_size: int = 1000) -> Iterator[LangRecord]:
+        self._flush_for_read()
+        return self.backend.iter_langs(guild_id, batch_size)
+
+    def delete_langs_many(self, keys: Iterable[Tuple[int, int]]) -> int:
+        keys = list(keys)
+        with self._flush_lock:
+            with self._lock:
+                for key in keys:
+                    self._langs.pop(key, None)
+            return self.backend.delete_langs_many(keys)
+
+    def get_lang(self, guild_id: int, user_id: int) -> str:
+        key = (guild_id, user_id)
+        lang = self._langs.get(key)
+        if lang is None:
+            lang = self._flushing_langs.get(key)
+        if lang is not None:
+            return lang
+        return self.backend.get_lang(guild_id, user_id)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        try:
+            flushed = self.flush()
+            if flushed:
+                log.info("Write-behind flushed %d pending write(s) on shutdown", flushed)
+        finally:
+            self.backend.close()